@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Asyncio front-end to pyxie's sprite builder.  Requires python 3.7+.
+
+File reads are handed to the event loop's default executor while decoding,
+packing and encoding run in `executor` (a thread pool by default), so a read
+for one image overlaps the decode of another and the event loop itself is
+never blocked.  Many sprites can be built at once with `build_sprites_async`,
+which limits how many builds are in flight and yields each sprite as soon as
+it is finished."""
+
+import asyncio
+import functools
+import io
+
+from pyxie import archive, sprite
+from pyxie.sprite import Image
+
+__all__ = ['read_image_async', 'build_sprite_async', 'build_sprites_async',
+        'write_async', 'css_async', 'sass_async']
+
+async def _run(executor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+def _decode(path, data):
+    """Decode image bytes read from `path`.  The filename is kept on the image
+    since it is used to sort rectangles and to name the style rules."""
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    img.filename = path
+    return img
+
+def _compose(images, kwargs):
+    return sprite.Sprite(sprite.autopack(*images, **kwargs))
+
+async def read_image_async(path, executor=None):
+    """Read `path` without blocking the event loop and decode it in
+    `executor`, returning a loaded PIL image."""
+    data = await _run(None, archive.read, path)
+    return await _run(executor, _decode, path, data)
+
+async def build_sprite_async(paths, executor=None, **kwargs):
+    """The coroutine version of `sprite_from_paths`.  All of `paths` are read
+    and decoded concurrently, then packed and drawn in `executor`.  Keyword
+    arguments (`fieldcls`, `packtype`) are passed on to `autopack`."""
+    # read archive members in one pass over each archive
+    contents = await _run(None, archive.read_members, paths)
+
+    async def load(path):
+        if path not in contents:
+            return await read_image_async(path, executor)
+        return await _run(executor, _decode, path, contents.pop(path))
+
+    images = await asyncio.gather(*[load(p) for p in paths])
+    return await _run(executor, _compose, images, kwargs)
+
+async def build_sprites_async(groups, limit=4, executor=None, **kwargs):
+    """Build one sprite for each `(key, paths)` pair in `groups`, with at most
+    `limit` builds running at once.  This is an async generator yielding
+    `(key, sprite)` in the order in which the sprites are completed."""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def build(key, paths):
+        async with semaphore:
+            return key, await build_sprite_async(paths, executor, **kwargs)
+
+    tasks = [asyncio.ensure_future(build(key, paths)) for key, paths in groups]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def write_async(s, filename, executor=None, **kwargs):
+    """Encode and save sprite `s` to `filename` in `executor`.  Keyword
+    arguments are passed on to `Sprite.write`."""
+    await _run(executor, s.write, filename, **kwargs)
+    return s
+
+async def css_async(s, spriteurl=None, executor=None, **kwargs):
+    """Generate the css for sprite `s` in `executor`.  Keyword arguments
+    are passed on to `Sprite.css`."""
+    return await _run(executor, s.css, spriteurl, **kwargs)
+
+async def sass_async(s, spriteurl=None, executor=None, **kwargs):
+    """Generate sass mixins for sprite `s` in `executor`.  Keyword arguments
+    are passed on to `Sprite.sass`."""
+    return await _run(executor, s.sass, spriteurl, **kwargs)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Reading input images straight out of zip and tar archives.
+
+An image inside an archive is named by the path to the archive followed by
+the member's name inside it, eg. ``icons.zip/arrows/up.png``, and patterns
+like ``icons.tar.gz/arrows/*.png`` match members the same way a glob matches
+files.  Members are read into memory in the order they are stored in the
+archive, so compressed tarballs are only read through once."""
+
+import os
+import re
+import glob as _glob
+import fnmatch
+import tarfile
+import zipfile
+
+__all__ = ['split_path', 'glob', 'expand', 'read', 'read_members', 'getsizes']
+
+archive_re = re.compile(r'^(.+?\.(?:zip|tar|tgz|tbz2|tar\.gz|tar\.bz2))/(.*)$', re.I)
+
+def split_path(path):
+    """Split `path` into (archive, member) if it names a member of an
+    archive, or return (None, path) if it doesn't."""
+    match = archive_re.match(path)
+    if match and os.path.isfile(match.group(1)):
+        return match.group(1), match.group(2)
+    return None, path
+
+def _is_zip(path):
+    return path.lower().endswith('.zip')
+
+def members(archive):
+    """Return the names of the files in `archive`."""
+    if _is_zip(archive):
+        zf = zipfile.ZipFile(archive)
+        try:
+            return [i.filename for i in zf.infolist() if not i.filename.endswith('/')]
+        finally:
+            zf.close()
+    tf = tarfile.open(archive)
+    try:
+        return [i.name for i in tf.getmembers() if i.isfile()]
+    finally:
+        tf.close()
+
+def glob(expr):
+    """Like glob.glob, but also matches members inside of archives."""
+    archive, pattern = split_path(expr)
+    if archive is None:
+        return _glob.glob(expr)
+    depth = pattern.count('/')
+    return ['%s/%s' % (archive, name) for name in members(archive)
+            if name.count('/') == depth and fnmatch.fnmatchcase(name, pattern)]
+
+def expand(paths):
+    """Expand any archive patterns in `paths`, leaving other paths as is.
+    Raises IOError if a pattern matches nothing in its archive."""
+    expanded = []
+    for path in paths:
+        if split_path(path)[0] is None:
+            expanded.append(path)
+            continue
+        matches = glob(path)
+        if not matches:
+            raise IOError("No such archive member: %s" % path)
+        expanded += sorted(matches)
+    return expanded
+
+def read_members(paths):
+    """Read every archive member in `paths`, opening each archive once.
+    Returns a dict of {path: contents};  paths that are not archive members
+    are left out."""
+    wanted = {}
+    for path in paths:
+        archive, member = split_path(path)
+        if archive is not None:
+            wanted.setdefault(archive, {})[member] = path
+    contents = {}
+    for archive, names in wanted.items():
+        if _is_zip(archive):
+            zf = zipfile.ZipFile(archive)
+            try:
+                for info in zf.infolist():
+                    if info.filename in names:
+                        contents[names[info.filename]] = zf.read(info)
+            finally:
+                zf.close()
+            continue
+        tf = tarfile.open(archive)
+        try:
+            for info in tf:
+                if info.name in names and info.isfile():
+                    contents[names[info.name]] = tf.extractfile(info).read()
+        finally:
+            tf.close()
+    missing = [p for p in paths if split_path(p)[0] and p not in contents]
+    if missing:
+        raise IOError("No such archive member: %s" % missing[0])
+    return contents
+
+def read(path):
+    """Return the contents of a file or archive member."""
+    if split_path(path)[0] is not None:
+        return read_members([path])[path]
+    f = open(path, 'rb')
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+def getsizes(paths):
+    """Return a list of the sizes of each file or archive member in `paths`,
+    opening each archive once."""
+    wanted = {}
+    for path in paths:
+        archive, member = split_path(path)
+        if archive is not None:
+            wanted.setdefault(archive, set()).add(member)
+    sizes = {}
+    for archive, names in wanted.items():
+        if _is_zip(archive):
+            zf = zipfile.ZipFile(archive)
+            try:
+                infos = [(i.filename, i.file_size) for i in zf.infolist()]
+            finally:
+                zf.close()
+        else:
+            tf = tarfile.open(archive)
+            try:
+                infos = [(i.name, i.size) for i in tf]
+            finally:
+                tf.close()
+        for name, size in infos:
+            if name in names:
+                sizes['%s/%s' % (archive, name)] = size
+    return [sizes[p] if p in sizes else os.path.getsize(p) for p in paths]
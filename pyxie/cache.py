@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A persistent on-disk cache of decoded images, so that images which haven't
+changed since the last build are never decoded again.
+
+Each image's pixels are stored uncompressed in the cache directory in a
+normalized mode (1 bit images become L, paletted images keep their palette,
+and anything other than L, LA, RGB, RGBA and P becomes RGBA).  Cached images
+are memory-mapped straight into PIL, and L, P and RGBA images aren't even
+copied.
+
+An image is looked up by its path.  If its modification time and size match
+the cache entry it is a hit without reading the file;  otherwise the file is
+read and it is still a hit if its content hash hasn't changed.  The least
+recently used images are evicted once the cache holds more than `max_size`
+bytes of pixels.  Several builds can share a cache directory:  each merges
+in the others' entries when it saves the index."""
+
+import io
+import os
+import json
+import mmap
+import time
+import hashlib
+import tempfile
+import threading
+
+from pyxie import archive
+from pyxie.sprite import Image
+
+__all__ = ['ImageCache']
+
+cached_modes = ('L', 'LA', 'RGB', 'RGBA', 'P')
+
+def normalize(img):
+    """Return `img` in one of the modes the cache stores."""
+    if img.mode in cached_modes:
+        return img
+    if img.mode == '1':
+        return img.convert('L')
+    return img.convert('RGBA')
+
+def _key(path):
+    """The index key for `path`.  json gives the keys of the index back as
+    text, so byte string paths (on python 2) are decoded to match;  paths
+    that aren't utf-8 may share a key, but an entry is only used if its
+    file's modification time and size or content hash match."""
+    if isinstance(path, bytes):
+        return path.decode('utf-8', 'replace')
+    return path
+
+class ImageCache(object):
+    def __init__(self, directory, max_size=256*1024*1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.index_path = os.path.join(directory, 'index.json')
+        self.lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.index = self._read_index()
+
+    def _read_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        f = open(self.index_path)
+        try:
+            return json.load(f)
+        except ValueError:
+            return {}
+        finally:
+            f.close()
+
+    def _stat(self, path):
+        """Return the (mtime, size) used to check whether `path` has changed;
+        for archive members, that of the archive."""
+        st = os.stat(archive.split_path(path)[0] or path)
+        return st.st_mtime, st.st_size
+
+    def _raw_path(self, entry):
+        return os.path.join(self.directory, entry['raw'])
+
+    def _load(self, path, entry):
+        """Map the cached pixels for `path` into a PIL image."""
+        f = open(self._raw_path(entry), 'rb')
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        mode, size = entry['mode'], tuple(entry['dimensions'])
+        img = Image.frombuffer(mode, size, buf, 'raw', mode, 0, 1)
+        if entry.get('palette'):
+            img.putpalette(entry['palette'])
+        transparency = entry.get('transparency')
+        if transparency is not None:
+            if entry.get('transparency_type') == 'bytes':
+                transparency = bytes(bytearray(transparency))
+            elif isinstance(transparency, list):
+                transparency = tuple(transparency)
+            img.info['transparency'] = transparency
+        img.filename = path
+        entry['used'] = time.time()
+        return img
+
+    def get(self, path, data=None):
+        """Return the cached image for `path`, or None on a miss.  Without
+        `data`, only the modification time and size are checked;  given the
+        contents of the file as `data`, the content hash is checked."""
+        entry = self.index.get(_key(path))
+        if entry is None or not os.path.exists(self._raw_path(entry)):
+            return None
+        if data is None:
+            if list(self._stat(path)) != entry['stat']:
+                return None
+        elif hashlib.md5(data).hexdigest() != entry['hash']:
+            return None
+        else:
+            entry['stat'] = list(self._stat(path))
+        return self._load(path, entry)
+
+    def put(self, path, data, img):
+        """Cache the decoded image `img` read from `path`, whose contents
+        are `data`.  Returns the normalized image."""
+        img = normalize(img)
+        digest = hashlib.md5(data).hexdigest()
+        name = path if isinstance(path, bytes) else path.encode('utf-8')
+        entry = dict(
+            stat=list(self._stat(path)),
+            hash=digest,
+            raw=hashlib.md5(name + digest.encode('ascii')).hexdigest() + '.raw',
+            mode=img.mode,
+            dimensions=list(img.size),
+            used=time.time(),
+        )
+        pixels = img.tobytes()
+        entry['bytes'] = len(pixels)
+        if img.mode == 'P':
+            entry['palette'] = img.getpalette()
+        transparency = img.info.get('transparency')
+        if isinstance(transparency, bytes):
+            entry['transparency_type'] = 'bytes'
+            transparency = list(bytearray(transparency))
+        if transparency is not None:
+            entry['transparency'] = transparency
+        self._write(self._raw_path(entry), pixels)
+        old = self.index.get(_key(path))
+        if old and old['raw'] != entry['raw'] and os.path.exists(self._raw_path(old)):
+            os.remove(self._raw_path(old))
+        self.index[_key(path)] = entry
+        img.filename = path
+        return img
+
+    def _write(self, path, data):
+        """Write `data` to `path` atomically, so that a concurrent build never
+        maps a partially written file."""
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        f = os.fdopen(fd, 'wb')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        os.rename(tmp, path)
+
+    def merge(self):
+        """Merge in the entries other builds sharing the cache directory have
+        saved since the index was read, keeping the most recently used entry
+        for each image."""
+        for path, entry in self._read_index().items():
+            mine = self.index.get(path)
+            if mine is None or entry['used'] > mine['used']:
+                if os.path.exists(self._raw_path(entry)):
+                    self.index[path] = entry
+        # and drop the entries whose pixels another build has evicted
+        for path, entry in list(self.index.items()):
+            if not os.path.exists(self._raw_path(entry)):
+                del self.index[path]
+
+    def evict(self, stale=60):
+        """Remove the least recently used images until the cache holds at
+        most `max_size` bytes of pixels.  Files in the cache directory that
+        the index doesn't know of, and that haven't been touched for `stale`
+        seconds, are left over from other builds or from ones that were
+        interrupted, and are removed too."""
+        total = sum([e['bytes'] for e in self.index.values()])
+        for path, entry in sorted(self.index.items(), key=lambda i: i[1]['used']):
+            if total <= self.max_size:
+                break
+            if os.path.exists(self._raw_path(entry)):
+                os.remove(self._raw_path(entry))
+            del self.index[path]
+            total -= entry['bytes']
+        known = set([e['raw'] for e in self.index.values()])
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if name in known or not name.endswith(('.raw', '.tmp')):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > stale:
+                    os.remove(path)
+            except OSError:
+                # another build removed it first
+                pass
+
+    def save(self):
+        """Merge in entries saved by other builds, evict old images and save
+        the cache index."""
+        self.merge()
+        self.evict()
+        self._write(self.index_path, json.dumps(self.index).encode('utf-8'))
+
+    def open_images(self, paths):
+        """Like `sprite.open_images`, but taking images from the cache where
+        possible and caching the rest.  Safe to call from several threads."""
+        self.lock.acquire()
+        try:
+            return self._open_images(paths)
+        finally:
+            self.lock.release()
+
+    def _open_images(self, paths):
+        images = dict((path, self.get(path)) for path in paths)
+        misses = [path for path in paths if images[path] is None]
+        contents = archive.read_members(misses)
+        for path in misses:
+            data = contents[path] if path in contents else archive.read(path)
+            img = self.get(path, data)
+            if img is None:
+                img = Image.open(io.BytesIO(data))
+                img.filename = path
+                img = self.put(path, data, img)
+            images[path] = img
+        self.save()
+        return [images[path] for path in paths]
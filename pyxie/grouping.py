@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Usage-driven sprite grouping.  Rather than putting every image into one
+sprite, images are split into groups so that each page downloads as few bytes
+of images it doesn't show as possible.
+
+A usage map says which images each page shows and how often the page is
+viewed.  The cost of a grouping is the number of bytes all of those page views
+download:  every view of a page downloads every group it uses an image from,
+plus `request_cost` bytes of overhead for each of those groups.
+
+Grouping starts with the images that are used by exactly the same pages
+together, which never wastes a byte.  Then the two groups whose merge
+increases the cost least are merged, for as long as a merge lowers the cost
+or some page needs more than `max_requests` groups.
+"""
+
+import json
+
+__all__ = ['read_usage', 'group_images', 'usage_report']
+
+def read_usage(path):
+    """Read a usage map from a file, returning {page: (views, images)}.
+    A JSON file maps each page either to a list of image names, or to an
+    object with "views" and "images" keys.  Any other file is read as a log
+    with one page view per line:  the page followed by the images shown,
+    separated by whitespace."""
+    f = open(path)
+    try:
+        text = f.read()
+    finally:
+        f.close()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    usage = {}
+    if isinstance(data, dict):
+        for page, entry in data.items():
+            if isinstance(entry, dict):
+                usage[page] = (entry.get('views', 1), frozenset(entry['images']))
+            else:
+                usage[page] = (1, frozenset(entry))
+        return usage
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields or fields[0].startswith('#'):
+            continue
+        views, images = usage.get(fields[0], (0, frozenset()))
+        usage[fields[0]] = (views + 1, images | frozenset(fields[1:]))
+    return usage
+
+def _cost(views, pages, size, request_cost):
+    return sum([views[p] for p in pages]) * (size + request_cost)
+
+def group_images(usage, sizes, max_requests=None, request_cost=0):
+    """Group the images in `sizes`, a dict of {image: bytes}, according to
+    `usage` as returned by `read_usage`.  Returns a list of lists of images,
+    largest group first."""
+    views = dict((page, v) for page, (v, images) in usage.items())
+    signatures = {}
+    for image in sizes:
+        pages = frozenset([p for p, (v, images) in usage.items() if image in images])
+        signatures.setdefault(pages, []).append(image)
+    # each group is [pages, size, images]
+    groups = [[pages, sum([sizes[i] for i in images]), sorted(images)]
+            for pages, images in signatures.items()]
+
+    def requests(page):
+        return len([g for g in groups if page in g[0]])
+
+    while len(groups) > 1:
+        crowded = set()
+        if max_requests:
+            crowded = set([p for p in views if requests(p) > max_requests])
+        best = None
+        for i, g1 in enumerate(groups):
+            for j in range(i + 1, len(groups)):
+                g2 = groups[j]
+                if crowded and not (g1[0] & g2[0] & crowded):
+                    continue
+                pages = g1[0] | g2[0]
+                delta = _cost(views, pages, g1[1] + g2[1], request_cost) -\
+                        _cost(views, g1[0], g1[1], request_cost) -\
+                        _cost(views, g2[0], g2[1], request_cost)
+                if best is None or delta < best[0]:
+                    best = (delta, i, j)
+        if best is None or (best[0] >= 0 and not crowded):
+            break
+        delta, i, j = best
+        g1, g2 = groups[i], groups[j]
+        groups[i] = [g1[0] | g2[0], g1[1] + g2[1], sorted(g1[2] + g2[2])]
+        del groups[j]
+    groups.sort(key=lambda g: (-g[1], g[2]))
+    return [g[2] for g in groups]
+
+def usage_report(usage, groups, sizes, request_cost=0):
+    """Return a report of the expected bytes and requests for each page with
+    all of the images in one sprite, and with the images in `groups`.  Sizes
+    are estimated from `sizes`, the number of bytes per image."""
+    total = sum(sizes.values())
+    groupsizes = [(set(g), sum([sizes[i] for i in g])) for g in groups]
+    lines = ['%-40s %8s %12s %12s %9s' % ('page', 'views', 'before', 'after', 'requests')]
+    allviews, before, after = 0, 0, 0
+    for page in sorted(usage):
+        views, images = usage[page]
+        single = 1 if images & set(sizes) else 0
+        used = [size for g, size in groupsizes if g & images]
+        pagebefore = single * (total + request_cost)
+        pageafter = sum(used) + len(used) * request_cost
+        lines.append('%-40s %8d %12d %12d %4d -> %d' % (page, views,
+            pagebefore, pageafter, single, len(used)))
+        allviews += views
+        before += views * pagebefore
+        after += views * pageafter
+    if allviews:
+        lines.append('expected bytes per page view: %d before, %d after' % (
+            before // allviews, after // allviews))
+    return '\n'.join(lines) + '\n'
@@ -12,9 +12,21 @@ that extends the pack region as little as possible.  Repeat until you have
 placed the smallest rectangle.
 
 The coordinate system used here has the origin (0, 0) at the top-left.
+
+The greedy algorithm needs every rectangle up front, sorted largest first.
+`SkylineField` instead places rectangles one at a time as they arrive, and
+`pack_stream` packs an iterator of rectangles into a field while only holding
+a few of them at once.
 """
 
-__all__ = ['Rectangle', 'Field', 'VerticalField']
+import heapq
+
+__all__ = ['Rectangle', 'Field', 'VerticalField', 'SkylineField', 'pack_stream',
+        'PackingError']
+
+class PackingError(Exception):
+    """Raised when a field can't find anywhere to place a rectangle."""
+    pass
 
 class Rectangle(object):
     def __init__(self, x, y, data=None):
@@ -118,15 +130,15 @@ class Field(object):
         for rect in self.rectangles:
             for placement in (self.bottom_left, self.top_right):
                 result = placement(rect, rectangle)
-                if result is 0:
+                if result == 0:
                     placement(rect, rectangle, place=True)
                     return
                 # if we didn't have a collision
                 if result is not None:
                     attempts.append((result, -self.rectangles.index(rect), placement, rect))
-        attempts.sort()
+        attempts.sort(key=lambda attempt: attempt[:2])
         if not attempts:
-            import ipdb; ipdb.set_trace();
+            raise PackingError("No place found in the field for %r" % rectangle)
         result, blah, placement, rect = attempts[0]
         #print "Area increasing from %d to %d" % (self.area(), result)
         placement(rect, rectangle, place=True)
@@ -345,3 +357,77 @@ class AlternatingField(Field):
 
         self.x, self.y = self.calculate_bounds()
 
+class SkylineField(Field):
+    """A field of fixed width that places each rectangle as it arrives, at the
+    lowest spot along the "skyline" of the rectangles placed so far (the
+    left-most of the lowest, on a tie).  Placing a rectangle only looks at
+    the skyline, so it takes time proportional to the number of steps in it
+    rather than the number of rectangles.  A rectangle wider than the field
+    widens it."""
+    def __init__(self, width):
+        super(SkylineField, self).__init__()
+        self.width = width
+        # the skyline is a list of [x, y, width] segments, left to right
+        self.skyline = [[0, 0, width]] if width else []
+
+    def add_rectangle(self, rectangle):
+        if rectangle.x > self.width:
+            self.skyline.append([self.width, 0, rectangle.x - self.width])
+            self.width = rectangle.x
+        best = None
+        for i, (x, y, w) in enumerate(self.skyline):
+            if x + rectangle.x > self.width:
+                break
+            top = self.fit(i, rectangle.x)
+            if best is None or top < best[0]:
+                best = (top, i)
+        top, i = best
+        x = self.skyline[i][0]
+        self.rectangles.append(PositionedRectangle(x, top, rectangle))
+        self.raise_skyline(i, x, top + rectangle.y, rectangle.x)
+        self.x = max(self.x, x + rectangle.x)
+        self.y = max(self.y, top + rectangle.y)
+
+    def fit(self, index, width):
+        """Return the y that a rectangle `width` wide would be placed at if
+        its left side lined up with skyline segment `index`."""
+        x = self.skyline[index][0]
+        top = 0
+        for sx, sy, sw in self.skyline[index:]:
+            if sx >= x + width:
+                break
+            top = max(top, sy)
+        return top
+
+    def raise_skyline(self, index, x, y, width):
+        """Raise the skyline to `y` from `x` to `x + width`."""
+        end = x + width
+        segments = self.skyline[:index] + [[x, y, width]]
+        for sx, sy, sw in self.skyline[index:]:
+            if sx + sw > end:
+                left = max(sx, end)
+                segments.append([left, sy, sx + sw - left])
+        # merge neighbouring segments at the same height
+        self.skyline = []
+        for segment in segments:
+            if self.skyline and self.skyline[-1][1] == segment[1]:
+                self.skyline[-1][2] += segment[2]
+            else:
+                self.skyline.append(segment)
+
+def pack_stream(rectangles, field, lookahead=16):
+    """Pack the rectangles from the iterator `rectangles` into `field` one at
+    a time, yielding each PositionedRectangle as it is placed.  Up to
+    `lookahead` rectangles are held back, and the largest of them is placed
+    first, so the packing is nearly as good as sorting everything up front
+    while only ever holding `lookahead` rectangles.  Works best with a
+    `SkylineField`, which doesn't need its rectangles sorted."""
+    heap = []
+    for count, rect in enumerate(rectangles):
+        heapq.heappush(heap, (-rect.x * rect.y, -rect.x, count, rect))
+        if len(heap) > lookahead:
+            field.add_rectangle(heapq.heappop(heap)[-1])
+            yield field.rectangles[-1]
+    while heap:
+        field.add_rectangle(heapq.heappop(heap)[-1])
+        yield field.rectangles[-1]
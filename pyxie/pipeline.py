@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A composable, streaming sprite build pipeline.
+
+A stage is any callable that takes an iterable and returns an iterable, and a
+`Pipeline` chains stages together so that each stage pulls items from the one
+before it.  The standard stages build a sprite the same way as
+`sprite.sprite_from_glob`::
+
+    discover()  glob expressions -> paths
+    probe()     paths -> images, with only their headers read
+    decode()    images -> images, with their pixels read
+    pack()      images -> a packed field, once every image has arrived
+    compose()   fields -> sprites
+    stream()    images -> a sprite, packed and drawn as the images arrive
+    encode()    sprites -> sprites, written to disk
+    emit()      sprites -> sprites, with their styles written out
+
+Any other stage, eg. one that trims or drops images, can be inserted between
+them.  Wrapping a stage in `threaded` runs it on its own thread, connected to
+the next stage by a bounded queue, so that stages overlap;  `mapped` turns a
+function into a stage that runs on a thread or process pool, with a bounded
+number of items in flight.
+"""
+
+import sys
+import threading
+from collections import deque
+
+try:
+    from Queue import Queue, Full
+except ImportError:
+    from queue import Queue, Full
+
+from pyxie import archive, sprite
+from pyxie.packer import Field
+
+__all__ = ['Pipeline', 'threaded', 'mapped', 'discover', 'probe', 'decode',
+        'pack', 'stream', 'compose', 'encode', 'emit', 'build']
+
+class Pipeline(object):
+    """A chain of stages, each fed by the one before it."""
+    def __init__(self, *stages):
+        self.stages = list(stages)
+
+    def insert(self, index, stage):
+        """Insert `stage` before the stage at `index`."""
+        self.stages.insert(index, stage)
+
+    def __iter__(self):
+        return iter(self.stages)
+
+    def run(self, source):
+        """Feed `source` through every stage, returning an iterator over the
+        output of the last one.  Nothing runs until that is iterated."""
+        items = source
+        for stage in self.stages:
+            items = stage(items)
+        return iter(items)
+
+class _Failure(object):
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+if sys.version_info[0] >= 3:
+    def _reraise(exc_info):
+        raise exc_info[1].with_traceback(exc_info[2])
+else:
+    exec("""def _reraise(exc_info):
+    raise exc_info[0], exc_info[1], exc_info[2]
+""")
+
+def threaded(stage, maxsize=16):
+    """Run `stage` on its own thread.  Its output is handed on through a
+    queue holding at most `maxsize` items, so a fast stage can't run away
+    from a slow one.  Exceptions are raised again in the consumer with their
+    original traceback, and if the consumer stops early the thread stops
+    too, closing `stage`'s output."""
+    def run(items):
+        queue = Queue(maxsize)
+        done = object()
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    queue.put(item, True, 0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def worker():
+            # the consumer is always handed either a _Failure or done, even
+            # if the stage fails before it returns its output
+            output = None
+            try:
+                output = stage(items)
+                for item in output:
+                    if not put(item):
+                        return
+            except BaseException:
+                put(_Failure(sys.exc_info()))
+                return
+            finally:
+                if hasattr(output, 'close'):
+                    output.close()
+            put(done)
+
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                item = queue.get()
+                if item is done:
+                    break
+                if isinstance(item, _Failure):
+                    _reraise(item.exc_info)
+                yield item
+        finally:
+            stop.set()
+    return run
+
+def mapped(func, pool, window=16):
+    """A stage which applies `func` to every item on `pool`, either a
+    `multiprocessing.Pool` or a `multiprocessing.pool.ThreadPool`.  At most
+    `window` items are in flight at once, and results come out in order.
+    For a process pool, `func` and the items must be picklable."""
+    def run(items):
+        pending = deque()
+        for item in items:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= window:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    return run
+
+def discover():
+    """A stage that expands glob expressions (which may reach into
+    archives) into paths."""
+    def run(exprs):
+        for expr in exprs:
+            for path in archive.glob(expr):
+                yield path
+    return run
+
+def probe(cache=None, batch=64):
+    """A stage that opens paths as images, reading only their headers.  Paths
+    are opened `batch` at a time, so that each archive in a batch is only
+    read once;  pass an `ImageCache` as `cache` to use it."""
+    def run(paths):
+        chunk = []
+        for path in paths:
+            chunk.append(path)
+            if len(chunk) >= batch:
+                for img in sprite.open_images(chunk, cache):
+                    yield img
+                chunk = []
+        for img in sprite.open_images(chunk, cache):
+            yield img
+    return run
+
+def decode():
+    """A stage that reads the pixels of each image, which PIL otherwise only
+    does when the image is first drawn.  Run it `threaded` to decode images
+    while the stages after it pack and draw the ones before."""
+    def run(images):
+        for img in images:
+            img.load()
+            yield img
+    return run
+
+def pack(**kwargs):
+    """A stage that packs every image it receives into one field.  Keyword
+    arguments are passed on to `sprite.autopack`."""
+    def run(images):
+        options = dict(fieldcls=Field)
+        options.update(kwargs)
+        yield sprite.autopack(*list(images), **options)
+    return run
+
+def stream(width=512, lookahead=16):
+    """A stage that packs and draws images as they arrive, in place of `pack`
+    and `compose`;  see `sprite.StreamingSprite`.  Images are decoded as they
+    are drawn unless a `threaded` `decode` stage comes before it, in which
+    case images are decoded, packed and drawn at the same time."""
+    def run(images):
+        yield sprite.StreamingSprite(images, width, lookahead)
+    return run
+
+def compose():
+    """A stage that draws each packed field into a sprite."""
+    def run(fields):
+        for field in fields:
+            yield sprite.Sprite(field)
+    return run
+
+def encode(filename, **kwargs):
+    """A stage that writes each sprite to `filename`.  Keyword arguments are
+    passed on to `Sprite.write`."""
+    def run(sprites):
+        for s in sprites:
+            s.write(filename, **kwargs)
+            yield s
+    return run
+
+def emit(path=None, sass=False, spriteurl=None, **kwargs):
+    """A stage that writes the styles for each sprite to `path`, or to stdout
+    if it isn't given.  Keyword arguments are passed on to `Sprite.css`, or
+    `Sprite.sass` if `sass` is true."""
+    def run(sprites):
+        for s in sprites:
+            style = (s.sass if sass else s.css)(spriteurl, **kwargs)
+            if path is None:
+                sys.stdout.write(style)
+            else:
+                f = open(path, 'w')
+                f.write(style)
+                f.close()
+            yield s
+    return run
+
+def build(exprs, filename, cache=None, **kwargs):
+    """Build and write a sprite from glob expressions `exprs` with the
+    standard stages, probing images on their own thread while the paths
+    are discovered.  Keyword arguments are passed on to `pack`."""
+    pipeline = Pipeline(discover(), threaded(probe(cache)), pack(**kwargs),
+            compose(), encode(filename))
+    return list(pipeline.run(exprs))[0]
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Size and efficiency reports for sprites, to help decide which sprites are
+worth splitting or re-packing.
+
+For each sprite the report gives how much of the sheet its images fill
+(overall and for each cell of a grid over the sheet), how much memory the
+decoded sheet takes, how the encoded sheet compares with the input files,
+each image's share of the sheet, and the images whose removal would shrink
+the sheet the most.  Reports are plain dicts, so they can be written out as
+JSON, and `report_html` renders them as a page."""
+
+import os
+import json
+
+from pyxie import archive
+from pyxie.sprite import autopack, slugify, human_size
+from pyxie.packer import Field, BoxField, AlternatingField, SkylineField
+
+__all__ = ['sprite_report', 'report_html', 'write_report']
+
+html_template = """<html>
+    <head><title>pyxie sprite report</title><style type="text/css">
+    table { border-collapse: collapse; margin-bottom: 2em; }
+    td, th { border: 1px solid #ccc; padding: 2px 6px; text-align: right; }
+    td.name, th.name { text-align: left; }
+    </style></head>
+    <body>
+%(sprites)s
+    </body>
+</html>
+"""
+
+html_sprite_template = """<h2>%(sheet)s</h2>
+<p>%(width)dx%(height)d %(mode)s, %(fill).1f%% filled (%(wasted)d px wasted),
+%(memory)s decoded;  %(encoded)s encoded vs %(inputs)s of images</p>
+<h3>regions</h3>
+<table>%(regions)s</table>
+<h3>biggest space wasters</h3>
+<table><tr><th class="name">image</th><th>sheet without it</th><th>saving</th></tr>
+%(wasters)s</table>
+<h3>images</h3>
+<table><tr><th class="name">image</th><th>size</th><th>share</th><th>bytes</th></tr>
+%(images)s</table>
+"""
+
+html_waster_template = """<tr><td class="name">%(filename)s</td><td>%(width)dx%(height)d</td><td>%(saving)d px</td></tr>"""
+
+html_image_template = """<tr><td class="name">%(filename)s</td><td>%(w)dx%(h)d</td><td>%(share).1f%%</td><td>%(bytes)d</td></tr>"""
+
+def _bytes_per_pixel(mode):
+    # PIL keeps every multi-band image in 4 bytes per pixel
+    if mode in ('1', 'L', 'P'):
+        return 1
+    if mode.startswith('I;16'):
+        return 2
+    return 4
+
+def _overlap(a1, a2, b1, b2):
+    return max(0, min(a2, b2) - max(a1, b1))
+
+def _fieldcls(field):
+    """Return a callable making an empty field packed the same way as
+    `field`."""
+    if isinstance(field, SkylineField):
+        return lambda: SkylineField(field.width)
+    if hasattr(field, 'padding'):
+        return lambda: field.__class__(field.padding)
+    return field.__class__
+
+def regions(s, grid=4):
+    """Split the sheet into a `grid` by `grid` grid of regions, and return
+    how much of each region the images fill."""
+    width, height = s.field.x, s.field.y
+    xs = [width * i // grid for i in range(grid + 1)]
+    ys = [height * i // grid for i in range(grid + 1)]
+    cells = []
+    for row in range(grid):
+        for col in range(grid):
+            x1, x2, y1, y2 = xs[col], xs[col + 1], ys[row], ys[row + 1]
+            area = (x2 - x1) * (y2 - y1)
+            used = sum([_overlap(x1, x2, p.x, p.x + p.rect.x) *
+                    _overlap(y1, y2, p.y, p.y + p.rect.y) for p in s.field.rectangles])
+            cells.append(dict(x=x1, y=y1, w=x2 - x1, h=y2 - y1,
+                fill=float(used) / area if area else 1.0, wasted=area - used))
+    return cells
+
+def space_wasters(s, count=5, candidates=20, max_greedy=100):
+    """Repack the sprite without each of its `candidates` largest images, and
+    return the `count` whose removal shrinks the sheet the most, largest
+    saving first;  images whose removal saves nothing are left out.  Sheets
+    packed in a fixed order (eg. boxes) aren't repacked.
+
+    Greedy packing takes time growing with the cube of the number of images
+    (seconds for a few hundred), so a greedy sheet of more than `max_greedy`
+    images is instead repacked into a `SkylineField` as wide as the sheet,
+    and savings are measured against all of its images repacked that way."""
+    field = s.field
+    if isinstance(field, (BoxField, AlternatingField)):
+        return []
+    fieldcls = _fieldcls(field)
+    images = [p.rect.data for p in field.rectangles]
+    area = field.x * field.y
+    if type(field) is Field and len(images) > max_greedy:
+        fieldcls = lambda: SkylineField(field.x)
+        whole = autopack(*images, fieldcls=fieldcls)
+        area = whole.x * whole.y
+    largest = sorted(images, key=lambda i: i.size[0] * i.size[1], reverse=True)[:candidates]
+    wasters = []
+    for img in largest:
+        rest = [i for i in images if i is not img]
+        if not rest:
+            continue
+        smaller = autopack(*rest, fieldcls=fieldcls)
+        saving = area - smaller.x * smaller.y
+        if saving > 0:
+            wasters.append(dict(filename=img.filename, width=smaller.x,
+                height=smaller.y, saving=saving))
+    wasters.sort(key=lambda w: (-w['saving'], w['filename']))
+    return wasters[:count]
+
+def sprite_report(s, grid=4, wasters=5, candidates=20, max_greedy=100):
+    """Return a report on the sprite `s` as a dict.  See `regions` for `grid`
+    and `space_wasters` for `wasters`, `candidates` and `max_greedy`."""
+    width, height = s.field.x, s.field.y
+    area = width * height
+    paths = [p.rect.data.filename for p in s.field.rectangles]
+    sizes = dict(zip(paths, archive.getsizes(paths)))
+    filename = getattr(s, 'filename', None)
+    if filename and os.path.exists(filename):
+        encoded = os.path.getsize(filename)
+    else:
+        encoded = len(s.encode())
+    images, used = [], 0
+    for pos in s.field.rectangles:
+        img = pos.rect.data
+        used += pos.rect.x * pos.rect.y
+        images.append(dict(
+            filename=img.filename,
+            name=slugify(img.filename),
+            x=pos.x, y=pos.y,
+            w=pos.rect.x, h=pos.rect.y,
+            share=float(pos.rect.x * pos.rect.y) / area if area else 0.0,
+            bytes=sizes[img.filename],
+            memory=pos.rect.x * pos.rect.y * _bytes_per_pixel(img.mode),
+        ))
+    images.sort(key=lambda i: (-i['share'], i['filename']))
+    return dict(
+        sheet=filename,
+        mode=s.mode,
+        width=width, height=height,
+        fill=float(used) / area if area else 1.0,
+        wasted=area - used,
+        memory=area * _bytes_per_pixel(s.mode),
+        input_memory=sum([i['memory'] for i in images]),
+        encoded=encoded,
+        inputs=sum(sizes.values()),
+        regions=regions(s, grid),
+        wasters=space_wasters(s, wasters, candidates, max_greedy),
+        images=images,
+    )
+
+def report_html(reports):
+    """Render a list of reports from `sprite_report` as an html page."""
+    sprites = []
+    for report in reports:
+        grid = int(len(report['regions']) ** 0.5)
+        rows = []
+        for row in range(grid):
+            cells = report['regions'][row * grid:(row + 1) * grid]
+            rows.append('<tr>%s</tr>' % ''.join(['<td>%.0f%%</td>' % (c['fill'] * 100)
+                for c in cells]))
+        sprites.append(html_sprite_template % dict(
+            sheet=report['sheet'],
+            width=report['width'], height=report['height'], mode=report['mode'],
+            fill=report['fill'] * 100,
+            wasted=report['wasted'],
+            memory=human_size(report['memory']),
+            encoded=human_size(report['encoded']),
+            inputs=human_size(report['inputs']),
+            regions='\n'.join(rows),
+            wasters='\n'.join([html_waster_template % w for w in report['wasters']]),
+            images='\n'.join([html_image_template % dict(i, share=i['share'] * 100)
+                for i in report['images']]),
+        ))
+    return html_template % dict(sprites='\n'.join(sprites))
+
+def write_report(path, *sprites):
+    """Write a report on each of `sprites` to `path`, as html if it ends in
+    .html and as JSON otherwise."""
+    reports = [sprite_report(s) for s in sprites]
+    f = open(path, 'w')
+    try:
+        if path.lower().endswith(('.html', '.htm')):
+            f.write(report_html(reports))
+        else:
+            json.dump(dict(sprites=reports), f, indent=1, sort_keys=True)
+    finally:
+        f.close()
+    return reports
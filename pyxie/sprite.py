@@ -3,18 +3,29 @@
 
 """Pyxies main library;  builds sprites from images."""
 
+import io
 import os
 import re
-import glob
-from packer import *
+import json
+import base64
+import fnmatch
+import hashlib
+from multiprocessing.pool import ThreadPool
+from pyxie.packer import *
+from pyxie.packer import PositionedRectangle, HorizontalField, BoxField, AlternatingField
+from pyxie import archive, grouping
 
 try:
-    import Image
+    from PIL import Image
 except ImportError:
-    print "Error importing PIL; PIL is required for pyxie to work.  Original exception:"
-    import sys, traceback
-    traceback.print_exc()
-    sys.exit(-1)
+    try:
+        import Image
+    except ImportError:
+        raise ImportError("PIL is required for pyxie to work;  install Pillow or PIL")
+
+class SpriteError(Exception):
+    """Raised when a sprite is used in a way it can't be."""
+    pass
 
 def rectangle_sort(rect):
     """Creates a key with which to sort rectangles.  This key is:
@@ -26,35 +37,144 @@ def rectangle_sort(rect):
     width = img.size[0]
     return (area, width, os.path.basename(img.filename))
 
+def colour_signature(img):
+    """Return a coarse colour histogram of `img`, with 4 levels for each of
+    red, green, blue and alpha, taken from a thumbnail of the image."""
+    small = img.convert('RGBA').resize((8, 8))
+    signature = [0] * 256
+    for r, g, b, a in small.getdata():
+        signature[(r >> 6) << 6 | (g >> 6) << 4 | (b >> 6) << 2 | (a >> 6)] += 1
+    return signature
+
+def colour_distance(s1, s2):
+    return sum([abs(a - b) for a, b in zip(s1, s2)])
+
+def similarity_order(rects):
+    """Reorder rectangles that are already sorted by `rectangle_sort` so that
+    images of the same size are chained by colour similarity, each followed
+    by the remaining image most similar to it.  Only images of the same size
+    swap places, so the packed field has exactly the same shape, but similar
+    images end up next to each other where they compress better."""
+    ordered, last = [], None
+    i = 0
+    while i < len(rects):
+        size = (rects[i].x, rects[i].y)
+        run = []
+        while i < len(rects) and (rects[i].x, rects[i].y) == size:
+            run.append((rects[i], colour_signature(rects[i].data)))
+            i += 1
+        if last is None:
+            last = run[0][1]
+        while run:
+            nearest = min(range(len(run)), key=lambda j: colour_distance(last, run[j][1]))
+            rect, last = run.pop(nearest)
+            ordered.append(rect)
+    return ordered
+
 def autopack(*images, **kwargs):
     """Takes a list of PIL images, creates a Rectangle from them, orders them
     in a specific order, then packs them and returns the field.  Pass `fieldcls`
-    to customize which field you want to use."""
+    to customize which field you want to use.  Pass `order='similarity'` to
+    place images of the same size by colour similarity;  see
+    `similarity_order`."""
     fieldcls = kwargs.get('fieldcls', Field)
     packtype = kwargs.get('packtype', 'Greedy')
     rects = [Rectangle(*i.size, data=i) for i in images]
     if packtype in ('Greedy', 'Vertical', 'Horizontal'):
         rects.sort(key=rectangle_sort, reverse=True)
+        if kwargs.get('order') == 'similarity':
+            rects = similarity_order(rects)
     f = fieldcls()
     for rect in rects:
         f.add_rectangle(rect)
     return f
 
 def slugify(name):
-    """Slugify's a filename into something that is suitable for a css class name."""
+    """Slugify's a filename into something that is suitable for a css class name.
+    Images inside an archive are named after their name in the archive."""
     nonchr = re.compile(r'[^-_\w]')
+    name = archive.split_path(name)[1]
     name = '-'.join(name.split(".")[:-1])
     return nonchr.sub('-', name)
 
+class SharedPalette(object):
+    """A palette shared by several paletted images, with a single index for
+    transparent pixels.  Each image's pixels are remapped from its own palette
+    to the shared one when drawn onto the sprite."""
+    def __init__(self, transparency=None):
+        self.transparency = transparency
+        self.rgb = {}
+        self.luts = {}
+
+    def add(self, img):
+        """Add the colours used in paletted image `img` to this palette.
+        Returns False if it would take the palette over 256 colours, or if
+        `img` has partially transparent colours."""
+        transparent = transparent_indexes(img)
+        if transparent is None or (transparent and self.transparency is None):
+            return False
+        palette = (img.getpalette() or []) + [0] * 768
+        lut = list(range(256))
+        for count, index in img.getcolors(256):
+            if index in transparent:
+                lut[index] = self.transparency
+                continue
+            rgb = tuple(palette[index*3:index*3+3])
+            if rgb not in self.rgb:
+                reserved = 0 if self.transparency is None else 1
+                if len(self.rgb) + reserved >= 256:
+                    return False
+                self.rgb[rgb] = len(self.rgb) + reserved
+            lut[index] = self.rgb[rgb]
+        self.luts[id(img)] = bytes(bytearray(lut))
+        return True
+
+    @property
+    def colours(self):
+        """The palette as a flat list of r, g, b values."""
+        colours = [0, 0, 0] * 256
+        for rgb, index in self.rgb.items():
+            colours[index*3:index*3+3] = rgb
+        return colours
+
+    def remap(self, img):
+        """Return a copy of `img` using this palette's indexes."""
+        data = img.tobytes().translate(self.luts[id(img)])
+        return Image.frombytes('P', img.size, data)
+
 class Sprite(object):
     """A class representing a sprite sheet."""
 
+    # the background-repeat of every image in the sheet;  sheets of images
+    # packed with a VerticalField can be 'repeat-x', and with a
+    # HorizontalField 'repeat-y'
+    repeat = 'no-repeat'
+
     css_template = """.%(name)s {
-    background: transparent url(%(path)s) -%(x)dpx -%(y)dpx no-repeat;
+    background: transparent url(%(path)s) -%(x)dpx -%(y)dpx %(repeat)s;
     width: %(w)dpx; height: %(h)dpx;
 }
-.%(name)s-bg { background: transparent url (%(path)s) -%(x)dpx -%(y)dpx no-repeat }
-.%(name)s-bgr { background: transparent url(%(path)s) right -%(y)dpx no-repeat }
+"""
+
+    css_variants_template = """\
+.%(name)s-bg { background: transparent url (%(path)s) -%(x)dpx -%(y)dpx %(repeat)s }
+.%(name)s-bgr { background: transparent url(%(path)s) right -%(y)dpx %(repeat)s }
+"""
+
+    # compact styles set the background once for every class in the sprite,
+    # then only give the position and dimensions for each class
+    compact_css_shared_template = """%(selectors)s {
+    background: transparent url(%(path)s) %(repeat)s;
+}
+"""
+
+    compact_css_template = """\
+.%(name)s { background-position: -%(x)dpx -%(y)dpx; width: %(w)dpx; height: %(h)dpx }
+"""
+
+    compact_css_variants_template = """\
+.%(name)s-bg { background-position: -%(x)dpx -%(y)dpx }
+.%(name)s-bgr { background-position: right -%(y)dpx }
 """
 
     html_body_template = """<html>\n    <head><style type="text/css">
@@ -62,90 +182,290 @@ class Sprite(object):
     div { border: 1px solid red; }
     </style></head>
     <body>
-        <h2>old: %(count)d reqs @ %(old)s, new: %(new)s</h2>
+        <h2>old: %(count)d reqs @ %(old)s, new: %(new)s</h2>%(report)s
         %(body)s
     </body>\n</html>"""
 
+    html_inline_template = """
+        <h3>inline: %(reqs)d reqs @ %(size)s, external: 1 req @ %(external)s (css + sprite)</h3>"""
+
     html_img_template = """<h4>file "%(filename)s"</h4><div class="%(cls)s"></div>"""
 
     sass_template = """\
 =%(name)s
-    background: transparent url(%(path)s) -%(x)dpx -%(y)dpx no-repeat
+    background: transparent url(%(path)s) -%(x)dpx -%(y)dpx %(repeat)s
     width: %(w)dpx
     height: %(h)dpx
+"""
 
+    sass_variants_template = """
 =%(name)s-bg
-    background: transparent url(%(path)s) -%(x)dpx -%(y)dpx no-repeat
+    background: transparent url(%(path)s) -%(x)dpx -%(y)dpx %(repeat)s
 
 =%(name)s-bgr
-    background: transparent url(%(path)s) right -%(y)dpx no-repeat
+    background: transparent url(%(path)s) right -%(y)dpx %(repeat)s
+"""
+
+    # compact mixins @extend a placeholder holding the shared background
+    compact_sass_shared_template = """\
+%%%(sheet)s
+    background: transparent url(%(path)s) %(repeat)s
 """
 
-    def __init__(self, field):
+    compact_sass_template = """\
+=%(name)s
+    @extend %%%(sheet)s
+    background-position: -%(x)dpx -%(y)dpx
+    width: %(w)dpx
+    height: %(h)dpx
+"""
+
+    compact_sass_variants_template = """
+=%(name)s-bg
+    @extend %%%(sheet)s
+    background-position: -%(x)dpx -%(y)dpx
+
+=%(name)s-bgr
+    @extend %%%(sheet)s
+    background-position: right -%(y)dpx
+"""
+
+    def __init__(self, field, sheet=None, dirty=None):
+        """Draw the images in `field` onto a new sprite sheet.  To redraw only
+        part of a previously built sheet, pass that sheet as `sheet` and the
+        filenames of the images which have changed as `dirty`.  The mode of
+        the sheet is the smallest one that can hold every image without loss;
+        see `canvas_mode`."""
         self.field = field
-        self.img = Image.new("RGBA", (field.x, field.y))
-        self._draw()
+        self.mode, self.palette = canvas_mode(field)
+        if sheet is None or self.mode == 'P':
+            # a shared palette may have changed, so paletted sheets are redrawn
+            self.img = self._canvas()
+            dirty = None
+        else:
+            self.img = sheet.convert(self.mode)
+        self._draw(dirty)
+
+    def _canvas(self):
+        size = (self.field.x, self.field.y)
+        if self.mode != 'P':
+            return Image.new(self.mode, size)
+        img = Image.new('P', size, self.palette.transparency or 0)
+        img.putpalette(self.palette.colours)
+        return img
 
-    def _draw(self):
+    def _draw(self, dirty=None):
         for pos in self.field.rectangles:
-            self.img.paste(pos.rect.data, (pos.x, pos.y))
+            if dirty is None or pos.rect.data.filename in dirty:
+                data = pos.rect.data
+                if self.palette is not None:
+                    data = self.palette.remap(data)
+                elif 'transparency' in data.info:
+                    # converting to LA directly drops the transparency on
+                    # some versions of PIL
+                    data = data.convert('RGBA')
+                self.img.paste(data, (pos.x, pos.y))
 
     def show(self):
         self.img.show()
 
-    def write(self, filename):
-        if filename.endswith('gif'):
-            transparency = None
-            for r in self.field.rectangles:
-                if 'transparency' in r.rect.data.info:
-                    transparency = r.rect.data.info['transparency']
-                    break
-            if transparency is not None:
-                self.img.save(filename, transparency=transparency)
-                self.filename = filename
-                return
-        self.img.save(filename)
+    def _save_image(self, format):
+        """The image and extra options to PIL's Image.save when saving in
+        `format`.  GIF has no alpha channel, so a sheet with one is quantized
+        to 255 colours and its fully transparent pixels are given the one
+        index left over."""
+        if self.palette is not None:
+            if self.palette.transparency is None:
+                return self.img, {}
+            return self.img, dict(transparency=self.palette.transparency)
+        if format == 'GIF' and self.img.mode in ('RGBA', 'LA'):
+            transparent = self.img.split()[-1].point(lambda a: 255 if a == 0 else 0)
+            img = self.img.convert('RGB').convert('P', palette=Image.ADAPTIVE, colors=255)
+            img.paste(255, None, transparent)
+            return img, dict(transparency=255)
+        return self.img, {}
+
+    def write(self, filename, fingerprint=False):
+        """Save the sprite image to `filename`.  With `fingerprint`, a hash of
+        the encoded image is added to the filename, eg. sprite.1a2b3c4d.png,
+        and the sprite is saved there instead;  `url` adds the same hash to
+        the sprite url used in the styles.  The encoded image is kept, so
+        that `encode` doesn't have to encode it again."""
+        format = image_format(filename)
+        data = self.encode(format)
+        self.logical_filename = filename
+        self.fingerprint = None
         self.filename = filename
+        if fingerprint:
+            self.fingerprint = hashlib.md5(data).hexdigest()[:8]
+            self.filename = fingerprinted(filename, self.fingerprint)
+        f = open(self.filename, 'wb')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        self.encoded = (format, data)
 
-    def sass(self, spriteurl=None):
-        if not spriteurl and not hasattr(self, "filename"):
-            print "Please write this sprite to an image or provide a spriteurl."""
-            return
-        rules = []
-        spriteurl = spriteurl if spriteurl else self.filename
+    def url(self, spriteurl=None):
+        """Return the url of the sprite image to use in styles.  This is the
+        filename the sprite was written to, unless `spriteurl` is given;  if
+        the sprite was written with a fingerprint, `spriteurl` gets the same
+        fingerprint."""
+        if not spriteurl:
+            return self.filename
+        if getattr(self, 'fingerprint', None):
+            return fingerprinted(spriteurl, self.fingerprint)
+        return spriteurl
+
+    def encode(self, format=None):
+        """Return the sprite image encoded in memory.  The format defaults to
+        the one the sprite was written in, or PNG if it hasn't been.  Once
+        the sprite is written, the bytes written are returned for its format
+        rather than encoding it again."""
+        if format is None:
+            format = image_format(getattr(self, 'filename', 'sprite.png'))
+        encoded = getattr(self, 'encoded', None)
+        if encoded and encoded[0] == format:
+            return encoded[1]
+        buf = io.BytesIO()
+        img, options = self._save_image(format)
+        img.save(buf, format, **options)
+        return buf.getvalue()
+
+    def data_uri(self, format=None, data=None):
+        """Return the encoded sprite as a base64 data uri."""
+        if format is None:
+            format = image_format(getattr(self, 'filename', 'sprite.png'))
+        if data is None:
+            data = self.encode(format)
+        mimetype = Image.MIME.get(format, 'image/%s' % format.lower())
+        return 'data:%s;base64,%s' % (mimetype, base64.b64encode(data).decode('ascii'))
+
+    def _inline_url(self, spriteurl, inline):
+        """Return a data uri for this sprite if `inline` is a size threshold
+        and the encoded sprite is no bigger than it, otherwise `spriteurl`."""
+        if inline is None:
+            return spriteurl
+        data = self.encode()
+        if len(data) > inline:
+            return spriteurl
+        return self.data_uri(data=data)
+
+    def layout(self, options=None):
+        """Return the layout of this sprite as a dict that can be saved and
+        later handed to `sprite_from_layout`.  `options` is any string that
+        identifies the options the sprite was built with;  a saved layout is
+        only reused by a build with the same options."""
+        images = []
+        hexdigests = digests([pos.rect.data.filename for pos in self.field.rectangles])
         for pos in self.field.rectangles:
             rect = pos.rect
-            context = dict(
-                name=slugify(rect.data.filename),
-                path=spriteurl,
+            images.append(dict(
+                filename=rect.data.filename,
                 x=pos.x, y=pos.y,
-                w=rect.x, h=rect.y
-            )
-            rules.append(self.sass_template % context)
-        return '\n'.join(rules)
+                w=rect.x, h=rect.y,
+                digest=hexdigests[rect.data.filename],
+            ))
+        return dict(
+            sheet=getattr(self, 'filename', None),
+            options=options,
+            field=field_options(self.field),
+            size=[self.field.x, self.field.y],
+            images=images,
+        )
 
-    def css(self, spriteurl=None):
-        if not hasattr(self, "filename"):
-            print "Please write this sprite to an image first."""
-            return
-        spriteurl = spriteurl if spriteurl else self.filename
+    def write_layout(self, path, options=None):
+        f = open(path, 'w')
+        json.dump(self.layout(options), f, indent=1)
+        f.close()
+
+    def _rules(self, template, path, sheet):
+        """Render `template` for every image in the sprite."""
         rules = []
         for pos in self.field.rectangles:
             rect = pos.rect
             context = dict(
                 name=slugify(rect.data.filename),
-                path=spriteurl,
+                sheet=sheet,
+                path=path,
+                repeat=self.repeat,
                 x=pos.x, y=pos.y,
                 w=rect.x, h=rect.y
             )
-            rules.append(self.css_template % context)
-        return '\n'.join(rules)
+            rules.append(template % context)
+        return rules
+
+    def _placeholder(self, spriteurl):
+        """The name of the sass placeholder selector for compact mixins."""
+        return slugify(os.path.basename(spriteurl)) + '-sheet'
+
+    def _selectors(self, variants=True):
+        selectors = []
+        for pos in self.field.rectangles:
+            name = slugify(pos.rect.data.filename)
+            selectors.append('.' + name)
+            if variants:
+                selectors += ['.%s-bg' % name, '.%s-bgr' % name]
+        return selectors
+
+    def sass(self, spriteurl=None, compact=False, variants=True, inline=None):
+        """Return sass mixins for each image in the sprite.  With `compact`,
+        the background image is declared once in a placeholder selector that
+        each mixin @extends.  Pass `variants=False` to leave out the -bg and
+        -bgr mixins.  If `inline` is given, a sprite which encodes to at most
+        that many bytes is embedded as a data uri;  this implies `compact`.
+        Raises `SpriteError` if the sprite has no url yet."""
+        if not spriteurl and not hasattr(self, "filename"):
+            raise SpriteError("Write this sprite to an image or provide a spriteurl first.")
+        url = self.url(spriteurl)
+        sheet = self._placeholder(spriteurl or self.logical_filename)
+        path = self._inline_url(url, inline)
+        if compact or path != url:
+            template = self.compact_sass_template
+            if variants:
+                template += self.compact_sass_variants_template
+            shared = self.compact_sass_shared_template % dict(path=path, sheet=sheet,
+                    repeat=self.repeat)
+            return '\n'.join([shared] + self._rules(template, path, sheet))
+        template = self.sass_template
+        if variants:
+            template += self.sass_variants_template
+        return '\n'.join(self._rules(template, path, sheet))
 
-    def html(self):
+    def css(self, spriteurl=None, compact=False, variants=True, inline=None):
+        """Return css classes for each image in the sprite.  With `compact`,
+        the background image is declared once for all of the classes, which
+        then only set their position and dimensions.  Pass `variants=False`
+        to leave out the -bg and -bgr classes.  If `inline` is given, a sprite
+        which encodes to at most that many bytes is embedded as a data uri;
+        this implies `compact`.  Raises `SpriteError` if the sprite hasn't
+        been written yet."""
         if not hasattr(self, "filename"):
-            print "Please write this sprite to an image first."""
-            return
-        css = self.css()
+            raise SpriteError("Write this sprite to an image first.")
+        url = self.url(spriteurl)
+        sheet = self._placeholder(spriteurl or self.logical_filename)
+        path = self._inline_url(url, inline)
+        if compact or path != url:
+            template = self.compact_css_template
+            if variants:
+                template += self.compact_css_variants_template
+            shared = self.compact_css_shared_template % dict(path=path,
+                    repeat=self.repeat, selectors=',\n'.join(self._selectors(variants)))
+            return ''.join([shared] + self._rules(template, path, sheet))
+        template = self.css_template
+        if variants:
+            template += self.css_variants_template
+        return '\n'.join(self._rules(template, path, sheet))
+
+    def html(self, inline=None):
+        """Return a sample html page showing every image in the sprite, along
+        with how many requests and bytes the sprite saves.  If `inline` is
+        given, the page uses inlined styles and also compares them with the
+        styles for the external sprite file.  Raises `SpriteError` if the
+        sprite hasn't been written yet."""
+        if not hasattr(self, "filename"):
+            raise SpriteError("Write this sprite to an image first.")
+        css = self.css(inline=inline)
         imgs = []
         paths = []
         for pos in self.field.rectangles:
@@ -157,31 +477,431 @@ class Sprite(object):
             paths.append(rect.data.filename)
         oldsize = human_size(filesize(*paths))
         newsize = human_size(filesize(self.filename))
+        report = ''
+        if inline is not None:
+            spritesize = filesize(self.filename)
+            inlined = 'url(data:' in css
+            # inlined styles are compact, so compare against compact styles
+            external = self.css(compact=True) if inlined else css
+            report = self.html_inline_template % dict(
+                reqs=0 if inlined else 1,
+                size=human_size(len(css) + (0 if inlined else spritesize)),
+                external=human_size(len(external) + spritesize),
+            )
         return self.html_body_template % dict(
             css=css,
             body='\n'.join(imgs),
             count=len(paths),
             old=oldsize,
-            new=newsize
+            new=newsize,
+            report=report,
         )
 
+class StreamingSprite(Sprite):
+    """A sprite sheet drawn while its images are still arriving.  Images are
+    taken one at a time from an iterator, packed into a `SkylineField` of
+    `width` with `pack_stream` and pasted onto the sheet as soon as they are
+    placed;  the sheet doubles in size whenever an image lands beyond it, and
+    is cropped to fit at the end.  Images are decoded when they are drawn,
+    unless they already have been, and closed once they are drawn, so only
+    the `lookahead` images waiting to be placed are held at once.  Since the
+    images can't all be seen up front, the sheet is always in `mode` (RGBA by
+    default) rather than the smallest mode that would hold them."""
+    def __init__(self, images, width=512, lookahead=16, mode='RGBA'):
+        self.field = SkylineField(width)
+        self.mode, self.palette = mode, None
+        self.img = Image.new(mode, (width, 64))
+        rects = (Rectangle(*img.size, data=img) for img in images)
+        for pos in pack_stream(rects, self.field, lookahead):
+            self._grow(pos.x + pos.rect.x, pos.y + pos.rect.y)
+            data = pos.rect.data
+            self.img.paste(data if data.mode == mode else data.convert(mode), (pos.x, pos.y))
+            if hasattr(data, 'close'):
+                data.close()
+        self.img = self.img.crop((0, 0, self.field.x, self.field.y))
+
+    def _grow(self, x, y):
+        """Make sure the sheet reaches at least `x` by `y`."""
+        w, h = self.img.size
+        if x <= w and y <= h:
+            return
+        img = Image.new(self.mode, (max(x, w * 2) if x > w else w, max(y, h * 2) if y > h else h))
+        img.paste(self.img, (0, 0))
+        self.img = img
+
+def transparent_indexes(img):
+    """Return the set of palette indexes that are fully transparent in the
+    paletted image `img`, or None if some of its colours are only partially
+    transparent."""
+    transparency = img.info.get('transparency')
+    if transparency is None:
+        return set()
+    if isinstance(transparency, int):
+        return set([transparency])
+    alphas = bytearray(transparency)
+    if [a for a in alphas if 0 < a < 255]:
+        return None
+    return set(i for i, a in enumerate(alphas) if a == 0)
+
+def has_alpha(img):
+    """Return True if `img` has any pixels that aren't fully opaque, or a
+    transparent colour.  Images with an alpha band are only counted if some
+    pixel's alpha is below 255."""
+    if 'transparency' in img.info:
+        return True
+    if img.mode in ('RGBA', 'LA', 'PA'):
+        return img.getextrema()[-1][0] < 255
+    return False
+
+def canvas_mode(field):
+    """Return the mode and, for paletted sprites, the `SharedPalette` for a
+    sprite sheet holding the images in `field`.  The mode is the smallest one
+    that doesn't lose anything from any of the images:
+
+    * 'P' if they are all paletted and fit together in a 256 colour palette
+    * 'L' or 'LA' if they are all grayscale
+    * 'RGB' or 'RGBA' otherwise
+
+    An alpha channel (or transparent palette index) is only used if one of
+    the images has transparency, or if they don't cover the whole sheet."""
+    images = [pos.rect.data for pos in field.rectangles]
+    covered = sum([r.rect.x * r.rect.y for r in field.rectangles]) == field.x * field.y
+    alpha = not covered or bool([i for i in images if has_alpha(i)])
+    if images and not [i for i in images if i.mode != 'P']:
+        palette = SharedPalette(0 if alpha else None)
+        for img in images:
+            if not palette.add(img):
+                break
+        else:
+            return 'P', palette
+    if not [i for i in images if i.mode not in ('1', 'L', 'LA')]:
+        return ('LA' if alpha else 'L'), None
+    return ('RGBA' if alpha else 'RGB'), None
+
+def open_images(paths, cache=None):
+    """Open each of `paths` as a PIL image.  Only the image headers are read
+    until the pixels are needed.  Members of archives are read straight out
+    of their archive, and keep their archive path as their filename.  If a
+    `cache.ImageCache` is given, images are taken from it where possible."""
+    if cache is not None:
+        return cache.open_images(paths)
+    contents = archive.read_members(paths)
+    images = []
+    for path in paths:
+        if path in contents:
+            img = Image.open(io.BytesIO(contents[path]))
+            img.filename = path
+        else:
+            img = Image.open(path)
+        images.append(img)
+    return images
+
 def sprite_from_glob(*glob_exprs):
     filenames = []
     for expr in glob_exprs:
-        filenames += glob.glob(expr)
+        filenames += archive.glob(expr)
     return sprite_from_paths(*filenames)
 
-def sprite_from_paths(*paths):
-    images = [Image.open(f) for f in paths]
-    field = autopack(*images)
+def sprite_from_paths(*paths, **kwargs):
+    images = open_images(paths, kwargs.pop('cache', None))
+    field = autopack(*images, **kwargs)
     return Sprite(field)
 
+def smallest_sprite(*images, **kwargs):
+    """Pack `images` both in the default order and in colour similarity order,
+    and return the sprite that encodes to fewer bytes in `format` (PNG by
+    default), along with a dict of the encoded size for each order.  The rest
+    of the keyword arguments are passed on to `autopack`."""
+    format = kwargs.pop('format', 'PNG')
+    sizes, best = {}, None
+    for order in ('size', 'similarity'):
+        kwargs['order'] = order
+        s = Sprite(autopack(*images, **kwargs))
+        sizes[order] = len(s.encode(format))
+        if best is None or sizes[order] < best[0]:
+            best = (sizes[order], s)
+    return best[1], sizes
+
+def layout_path(spritepath):
+    """The path at which the layout for the sprite `spritepath` is saved."""
+    return os.path.splitext(spritepath)[0] + '.layout.json'
+
+def fingerprinted(path, fingerprint):
+    """Add `fingerprint` to a path or url, before its extension."""
+    root, ext = os.path.splitext(path)
+    return '%s.%s%s' % (root, fingerprint, ext)
+
+def update_manifest(path, *sprites):
+    """Add the names that fingerprinted `sprites` were written to to the json
+    manifest at `path`, which maps the name each sprite was written as to the
+    fingerprinted file name.  Both names are relative to the directory the
+    manifest is in."""
+    root = os.path.dirname(os.path.abspath(path))
+    def relative(filename):
+        return os.path.relpath(os.path.abspath(filename), root).replace(os.sep, '/')
+    manifest = {}
+    if os.path.exists(path):
+        f = open(path)
+        try:
+            manifest = json.load(f)
+        finally:
+            f.close()
+    for s in sprites:
+        manifest[relative(s.logical_filename)] = relative(s.filename)
+    f = open(path, 'w')
+    try:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    finally:
+        f.close()
+
+field_classes = dict((cls.__name__, cls) for cls in (Field, VerticalField,
+    HorizontalField, BoxField, AlternatingField, SkylineField))
+
+def field_options(field):
+    """Return the class name and constructor arguments of `field` as a dict
+    that `make_field` can make an empty field like it from."""
+    options = dict(type=field.__class__.__name__)
+    for attr in ('padding', 'xpadding', 'ypadding', 'width'):
+        if hasattr(field, attr):
+            options[attr] = getattr(field, attr)
+    return options
+
+def make_field(options):
+    """Make an empty field from the options returned by `field_options`."""
+    options = dict(options)
+    cls = field_classes[options.pop('type')]
+    return cls(**dict((str(k), v) for k, v in options.items()))
+
+def read_layout(path):
+    f = open(path)
+    try:
+        return json.load(f)
+    finally:
+        f.close()
+
+def field_from_layout(layout, images):
+    """Rebuild a packed field, of the same class as the one that was saved,
+    from a saved layout and a list of PIL images.  If the images' filenames or
+    sizes do not match the layout exactly, then the layout is stale and None
+    is returned."""
+    byname = dict((img.filename, img) for img in images)
+    entries = layout['images']
+    if len(byname) != len(images) or sorted(byname) != sorted(e['filename'] for e in entries):
+        return None
+    field = make_field(layout.get('field', dict(type='Field')))
+    for e in entries:
+        img = byname[e['filename']]
+        if tuple(img.size) != (e['w'], e['h']):
+            return None
+        field.rectangles.append(PositionedRectangle(e['x'], e['y'], Rectangle(e['w'], e['h'], data=img)))
+    field.x, field.y = layout['size']
+    return field
+
+def sprite_from_layout(layout, *paths, **kwargs):
+    """Build a sprite for `paths` re-using a layout saved from a previous
+    build, skipping packing entirely.  When the previous sprite sheet is still
+    around, only the images whose contents have changed are drawn onto it.
+    Returns None if the layout cannot be reused and the sprite must be
+    packed again.  Pass `options` to make sure the layout was built with
+    the same options, and `cache` to use an `cache.ImageCache`."""
+    if layout.get('options') != kwargs.get('options'):
+        return None
+    images = open_images(paths, kwargs.get('cache'))
+    field = field_from_layout(layout, images)
+    if field is None:
+        return None
+    sheet, dirty = None, None
+    if layout.get('sheet') and os.path.exists(layout['sheet']):
+        sheet = Image.open(layout['sheet'])
+        if sheet.size == (field.x, field.y):
+            sheet.load()
+            saved = dict((e['filename'], e['digest']) for e in layout['images'])
+            current = digests(paths)
+            dirty = set(f for f in paths if current[f] != saved[f])
+        else:
+            sheet = None
+    return Sprite(field, sheet=sheet, dirty=dirty)
+
+def sprites_from_usage(usage, *paths, **kwargs):
+    """Split `paths` into groups by how they're used on pages and build a
+    sprite for each group.  `usage` is a usage map as returned by
+    `grouping.read_usage`, where images may be named by their path, their
+    filename or their css class name.  `max_requests` and `request_cost` are
+    passed on to `grouping.group_images` and the rest of the keyword arguments
+    to `autopack`.  Returns a list of sprites, and a report comparing the
+    expected bytes per page with those of a single sprite."""
+    options = dict((k, kwargs.pop(k)) for k in ('max_requests', 'request_cost') if k in kwargs)
+    names = {}
+    for path in paths:
+        for name in (slugify(path), os.path.basename(path), path):
+            names[name] = path
+    usage = dict((page, (views, frozenset([names[i] for i in images if i in names])))
+            for page, (views, images) in usage.items())
+    sizes = dict(zip(paths, archive.getsizes(paths)))
+    groups = grouping.group_images(usage, sizes, **options)
+    report = grouping.usage_report(usage, groups, sizes, options.get('request_cost', 0))
+    sprites = [Sprite(autopack(*open_images(group), **kwargs)) for group in groups]
+    return sprites, report
+
+repeats = ('no-repeat', 'repeat-x', 'repeat-y')
+repeat_re = re.compile(r'(?:^|[-_./])(repeat-[xy])(?:[-_./]|$)')
+
+def read_routes(path):
+    """Read a routes manifest:  a JSON object mapping 'repeat-x' and
+    'repeat-y' to lists of glob patterns.  Images whose path or filename
+    matches one of the patterns are routed to that sheet.  Raises
+    `SpriteError` if the manifest isn't one."""
+    f = open(path)
+    try:
+        try:
+            routes = json.load(f)
+        except ValueError:
+            raise SpriteError("%s is not valid json" % path)
+    finally:
+        f.close()
+    if not isinstance(routes, dict):
+        raise SpriteError("%s should map repeats to lists of patterns" % path)
+    for route, patterns in routes.items():
+        if route not in repeats:
+            raise SpriteError("Unknown route '%s' in %s" % (route, path))
+        if not isinstance(patterns, list):
+            raise SpriteError("Route '%s' in %s should be a list of patterns" % (route, path))
+    return routes
+
+def route_images(paths, routes=None):
+    """Sort `paths` by how their images repeat, returning a dict mapping each
+    of 'no-repeat', 'repeat-x' and 'repeat-y' to a list of paths.  Paths
+    matching one of the patterns in `routes`, as returned by `read_routes`,
+    go where it says;  the rest are routed by name, where 'repeat-x' or
+    'repeat-y' appear as a word of the path, eg. header-repeat-x.png or
+    repeat-y/rule.png."""
+    routed = dict((repeat, []) for repeat in repeats)
+    for path in paths:
+        repeat = None
+        for r, patterns in (routes or {}).items():
+            if [p for p in patterns if fnmatch.fnmatch(path, p)
+                    or fnmatch.fnmatch(os.path.basename(path), p)]:
+                repeat = r
+                break
+        if repeat is None:
+            match = repeat_re.search(archive.split_path(path)[1])
+            repeat = match.group(1) if match else 'no-repeat'
+        routed[repeat].append(path)
+    return routed
+
+def repeat_path(path, repeat):
+    """Return the path of the sheet for `repeat` images, eg. sprite-x.png for
+    'repeat-x' images in sprite.png."""
+    if repeat == 'no-repeat':
+        return path
+    root, ext = os.path.splitext(path)
+    return '%s-%s%s' % (root, repeat[-1], ext)
+
+def sprites_by_repeat(paths, routes=None, cache=None, xpadding=0, ypadding=0):
+    """Route `paths` with `route_images` and build a sheet for each kind of
+    repeat:  'repeat-x' images are packed with a VerticalField, 'repeat-y'
+    images with a HorizontalField and the rest with a Field.  The images are
+    opened together, then the sheets are packed and drawn concurrently.
+    Returns a list of sprites with their `repeat` set, leaving out any
+    sheet without images."""
+    routed = route_images(paths, routes)
+    images = dict(zip(paths, open_images(paths, cache)))
+    packing = {
+        'no-repeat': dict(fieldcls=Field, packtype='Greedy'),
+        'repeat-x': dict(fieldcls=lambda: VerticalField(ypadding), packtype='Vertical'),
+        'repeat-y': dict(fieldcls=lambda: HorizontalField(xpadding), packtype='Horizontal'),
+    }
+    present = [r for r in repeats if routed[r]]
+    sprites = build_many([[images[p] for p in routed[r]] for r in present],
+            processes=len(present) or None, options=[packing[r] for r in present])
+    for s, repeat in zip(sprites, present):
+        s.repeat = repeat
+    return sprites
+
+class _Size(object):
+    """Stands in for an image when packing in another process;  `autopack`
+    only looks at an image's size and filename."""
+    def __init__(self, index, size, filename):
+        self.index, self.size, self.filename = index, size, filename
+
+def _pack_sizes(options, sizes, kwargs):
+    """Pack images of `sizes`, a list of (size, filename), into a field made
+    from `options` (see `field_options`).  Keyword arguments are passed on to
+    `autopack`.  Returns the width and height of the field and the index and
+    position of each image, so that only plain data crosses between
+    processes."""
+    kwargs = dict(kwargs, fieldcls=lambda: make_field(options))
+    field = autopack(*[_Size(i, size, filename) for i, (size, filename)
+            in enumerate(sizes)], **kwargs)
+    return field.x, field.y, [(p.rect.data.index, p.x, p.y) for p in field.rectangles]
+
+def _pack_in(pool, images, kwargs):
+    """Pack `images` with `_pack_sizes` on the process `pool` and rebuild the
+    field from the positions it sends back.  Returns None if they can't be
+    packed elsewhere:  when the field class isn't one of pyxie's own, or
+    when they are ordered by colour similarity, which needs their pixels."""
+    empty = kwargs.get('fieldcls', Field)()
+    if type(empty) not in field_classes.values() or kwargs.get('order') == 'similarity':
+        return None
+    options = field_options(empty)
+    kwargs = dict((k, v) for k, v in kwargs.items() if k != 'fieldcls')
+    sizes = [(tuple(img.size), img.filename) for img in images]
+    x, y, placed = pool.apply(_pack_sizes, (options, sizes, kwargs))
+    field = make_field(options)
+    for index, px, py in placed:
+        img = images[index]
+        field.rectangles.append(PositionedRectangle(px, py, Rectangle(*img.size, data=img)))
+    field.x, field.y = x, y
+    return field
+
+def build_many(groups, processes=None, options=None, pool=None, **kwargs):
+    """Pack and draw a sprite from each list of images in `groups` on a pool
+    of `processes` threads, one per cpu by default.  The sprites share
+    nothing, so this is safe to call from several threads.  PIL releases the
+    GIL for much of decoding and drawing, but packing is pure python and
+    holds it;  to pack on several cores, pass a `multiprocessing.Pool` as
+    `pool`, and each group's image sizes are sent to it to be packed, with
+    only their positions coming back.  Groups with a field class of their
+    own or ordered by colour similarity are always packed on the threads.
+
+    Keyword arguments are passed on to `autopack` for every group;
+    `options`, if given, is a list of extra keyword arguments for each
+    group.  Returns the sprites in the same order as `groups`.  Images must
+    not be shared between groups."""
+    groups = list(groups)
+    options = options or [{}] * len(groups)
+
+    def build(job):
+        images, extra = job
+        packkw = dict(kwargs)
+        packkw.update(extra)
+        field = None
+        if pool is not None:
+            field = _pack_in(pool, images, packkw)
+        if field is None:
+            field = autopack(*images, **packkw)
+        return Sprite(field)
+
+    threads = ThreadPool(processes)
+    try:
+        return threads.map(build, list(zip(groups, options)))
+    finally:
+        threads.close()
+
 # utils
+def image_format(filename):
+    """Guess the PIL image format to save `filename` in from its extension."""
+    Image.init()
+    return Image.EXTENSION.get(os.path.splitext(filename)[1].lower(), 'PNG')
+
+def digests(paths):
+    """Return a dict of hex digests of the contents of each of `paths`."""
+    contents = archive.read_members(paths)
+    return dict((p, hashlib.md5(contents[p] if p in contents else archive.read(p)).hexdigest())
+            for p in paths)
+
 def filesize(*paths):
-    total = 0
-    for f in paths:
-        total += os.path.getsize(f)
-    return total
+    return sum(archive.getsizes(paths))
 
 def human_size(bytes):
     """Takes bits per second and returns a string w/ appropriate units."""
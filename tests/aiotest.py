@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""pyxie.aio tests;  skipped without python 3.7+ or PIL."""
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+from unittest import TestCase, skipIf
+
+try:
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from pyxie import aio
+    from pyxie.sprite import Image
+except (ImportError, SyntaxError):
+    aio = None
+
+def collect(agen):
+    """Run the async generator `agen` to the end, returning what it yields."""
+    loop = asyncio.new_event_loop()
+    items = []
+    try:
+        while True:
+            try:
+                items.append(loop.run_until_complete(agen.__anext__()))
+            except StopAsyncIteration:
+                return items
+    finally:
+        loop.close()
+
+@skipIf(aio is None, "requires python 3.7+ and PIL")
+class AioTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.paths = []
+        for i, size in enumerate([(16, 16), (32, 8), (8, 8)]):
+            path = os.path.join(self.dir, 'img%d.png' % i)
+            Image.new('RGB', size, (i * 80, 0, 0)).save(path)
+            self.paths.append(path)
+        self.compose = aio._compose
+
+    def tearDown(self):
+        aio._compose = self.compose
+        shutil.rmtree(self.dir)
+
+    def test_build_sprite(self):
+        s = asyncio.run(aio.build_sprite_async(self.paths))
+        self.failUnless(len(s.field.rectangles) == 3)
+        for pos in s.field.rectangles:
+            drawn = s.img.getpixel((pos.x, pos.y))[:3]
+            self.failUnless(drawn == pos.rect.data.getpixel((0, 0)))
+        asyncio.run(aio.write_async(s, os.path.join(self.dir, 'sprite.png')))
+        self.failUnless(os.path.exists(s.filename))
+        css = asyncio.run(aio.css_async(s, '/sprite.png'))
+        self.failUnless('img1 {' in css and 'url(/sprite.png)' in css)
+
+    def test_limit_and_completion_order(self):
+        """No more than `limit` builds run at once, and sprites are yielded
+        as they are finished rather than in the order they were given."""
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def compose(images, kwargs):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            # the first group is the slowest
+            time.sleep(0.2 if len(images) == 3 else 0.02)
+            with lock:
+                running[0] -= 1
+            return self.compose(images, kwargs)
+        aio._compose = compose
+
+        groups = [('slow', self.paths)] + [('fast%d' % i, self.paths[:1]) for i in range(4)]
+        executor = ThreadPoolExecutor(8)
+        try:
+            results = collect(aio.build_sprites_async(groups, limit=2, executor=executor))
+        finally:
+            executor.shutdown()
+        keys = [key for key, s in results]
+        self.failUnless(sorted(keys) == sorted([key for key, paths in groups]))
+        self.failUnless(keys[-1] == 'slow')
+        self.failUnless(running[1] == 2)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""pyxie.archive tests."""
+
+import os
+import io
+import shutil
+import tarfile
+import zipfile
+import tempfile
+from unittest import TestCase
+
+from pyxie import archive
+
+contents = {
+    'logo.png': b'logo',
+    'arrows/up.png': b'up!',
+    'arrows/down.png': b'down',
+    'arrows/old/left.png': b'left!',
+}
+
+class ArchiveTest(TestCase):
+    """The same files in a zip, a tar.gz and a directory."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.zip = self.path('icons.zip')
+        zf = zipfile.ZipFile(self.zip, 'w')
+        for name, data in sorted(contents.items()):
+            zf.writestr(name, data)
+        zf.close()
+        self.tar = self.path('icons.tar.gz')
+        tf = tarfile.open(self.tar, 'w:gz')
+        for name, data in sorted(contents.items()):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+        tf.close()
+        os.mkdir(self.path('plain'))
+        f = open(self.path('plain/logo.png'), 'wb')
+        f.write(contents['logo.png'])
+        f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def test_split_path(self):
+        self.failUnless(archive.split_path(self.zip + '/arrows/up.png') == (self.zip, 'arrows/up.png'))
+        self.failUnless(archive.split_path(self.tar + '/logo.png') == (self.tar, 'logo.png'))
+        plain = self.path('plain/logo.png')
+        self.failUnless(archive.split_path(plain) == (None, plain))
+        # only existing archives are split
+        missing = self.path('missing.zip/logo.png')
+        self.failUnless(archive.split_path(missing) == (None, missing))
+
+    def test_glob(self):
+        for arc in (self.zip, self.tar):
+            # patterns only match members at the same depth
+            self.failUnless(sorted(archive.glob(arc + '/*.png')) == [arc + '/logo.png'])
+            self.failUnless(sorted(archive.glob(arc + '/arrows/*.png')) ==
+                [arc + '/arrows/down.png', arc + '/arrows/up.png'])
+            self.failUnless(archive.glob(arc + '/*/*/*.png') == [arc + '/arrows/old/left.png'])
+        self.failUnless(archive.glob(self.path('plain/*.png')) == [self.path('plain/logo.png')])
+
+    def test_expand(self):
+        plain = self.path('plain/logo.png')
+        self.failUnless(archive.expand([plain, self.zip + '/arrows/*.png']) ==
+            [plain, self.zip + '/arrows/down.png', self.zip + '/arrows/up.png'])
+        self.assertRaises(IOError, archive.expand, [self.zip + '/arrows/*.gif'])
+        self.assertRaises(IOError, archive.expand, [self.tar + '/nothing.png'])
+
+    def test_read_members(self):
+        plain = self.path('plain/logo.png')
+        paths = [self.zip + '/arrows/up.png', self.tar + '/arrows/old/left.png',
+            self.tar + '/logo.png', plain]
+        read = archive.read_members(paths)
+        self.failUnless(read == {paths[0]: b'up!', paths[1]: b'left!', paths[2]: b'logo'})
+        self.failUnless(archive.read(paths[1]) == b'left!')
+        self.failUnless(archive.read(plain) == b'logo')
+        self.assertRaises(IOError, archive.read_members, [self.zip + '/arrows/left.png'])
+
+    def test_getsizes(self):
+        paths = [self.zip + '/arrows/down.png', self.tar + '/arrows/up.png',
+            self.path('plain/logo.png'), self.tar + '/arrows/old/left.png']
+        self.failUnless(archive.getsizes(paths) == [4, 3, 4, 5])
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""pyxie.cache tests;  skipped without PIL."""
+
+import os
+import time
+import shutil
+import tempfile
+from unittest import TestCase, skipIf
+
+try:
+    from pyxie import cache
+    from pyxie.sprite import Image
+except ImportError:
+    cache = None
+
+@skipIf(cache is None, "requires PIL")
+class ImageCacheTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cachedir = os.path.join(self.dir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def image(self, name, colour=(255, 0, 0), size=(8, 8)):
+        path = self.path(name)
+        Image.new('RGB', size, colour).save(path)
+        return path
+
+    def paletted(self, name):
+        """Save a paletted image with a transparent index and return its
+        path."""
+        img = Image.new('P', (8, 8), 0)
+        img.putpalette([255, 0, 0, 0, 0, 0] + [0] * 762)
+        img.paste(1, (0, 0, 4, 8))
+        path = self.path(name)
+        img.save(path, transparency=1)
+        return path
+
+    def test_round_trip(self):
+        paths = [self.image('a.png'), self.paletted('b.png'), self.paletted('c.gif')]
+        originals = [Image.open(p) for p in paths]
+        first = cache.ImageCache(self.cachedir).open_images(paths)
+        second = cache.ImageCache(self.cachedir).open_images(paths)
+        for original, cached in zip(originals, second):
+            self.failUnless(cached.mode == original.mode)
+            self.failUnless(cached.size == original.size)
+            self.failUnless(cached.info.get('transparency') == original.info.get('transparency'))
+            self.failUnless(list(cached.convert('RGBA').getdata()) ==
+                list(original.convert('RGBA').getdata()))
+        self.failUnless([i.filename for i in first] == paths)
+        self.failUnless([i.filename for i in second] == paths)
+
+    def test_unicode_path(self):
+        path = self.image('café.png')
+        cache.ImageCache(self.cachedir).open_images([path])
+        self.failUnless(cache.ImageCache(self.cachedir).get(path) is not None)
+
+    def test_unchanged_stat(self):
+        """Images whose modification time and size are unchanged are never
+        read again."""
+        path = self.image('a.png')
+        cache.ImageCache(self.cachedir).open_images([path])
+        c = cache.ImageCache(self.cachedir)
+        self.failUnless(c.get(path) is not None)
+        read = cache.archive.read
+        cache.archive.read = None
+        try:
+            self.failUnless(c.open_images([path])[0].getpixel((0, 0)) == (255, 0, 0))
+        finally:
+            cache.archive.read = read
+
+    def test_content_hash(self):
+        """A touched image is a hit if its contents haven't changed, and a
+        miss if they have."""
+        path = self.image('a.png')
+        c = cache.ImageCache(self.cachedir)
+        c.open_images([path])
+        data = open(path, 'rb').read()
+        mtime = os.path.getmtime(path) + 10
+        os.utime(path, (mtime, mtime))
+        self.failUnless(c.get(path) is None)
+        self.failUnless(c.get(path, data) is not None)
+        # the new modification time is recorded
+        self.failUnless(c.get(path) is not None)
+        self.image('a.png', (0, 0, 255))
+        os.utime(path, (mtime + 10, mtime + 10))
+        self.failUnless(c.get(path, open(path, 'rb').read()) is None)
+        self.failUnless(c.open_images([path])[0].getpixel((0, 0)) == (0, 0, 255))
+
+    def test_eviction(self):
+        """The least recently used images are evicted first."""
+        paths = [self.image('%s.png' % name) for name in 'abc']
+        # 8x8 RGB images take 192 bytes each
+        c = cache.ImageCache(self.cachedir, max_size=2 * 192)
+        for path in paths:
+            c.open_images([path])
+            time.sleep(0.01)
+        self.failUnless(sorted(c.index) == paths[1:])
+        raws = [n for n in os.listdir(self.cachedir) if n.endswith('.raw')]
+        self.failUnless(len(raws) == 2)
+        c.open_images([paths[1]])
+        time.sleep(0.01)
+        c.open_images([paths[0]])
+        self.failUnless(sorted(c.index) == [paths[0], paths[1]])
+
+    def test_shared_directory(self):
+        """Builds sharing a cache directory keep each other's entries, and
+        pixels nothing refers to are removed."""
+        a, b = self.image('a.png'), self.image('b.png', (0, 255, 0))
+        first = cache.ImageCache(self.cachedir)
+        second = cache.ImageCache(self.cachedir)
+        first.open_images([a])
+        second.open_images([b])
+        self.failUnless(sorted(cache.ImageCache(self.cachedir).index) == [a, b])
+        raws = [n for n in os.listdir(self.cachedir) if n.endswith('.raw')]
+        self.failUnless(len(raws) == 2)
+        # files left over from an interrupted build
+        for name in ('orphan.raw', 'tmpabc.tmp'):
+            path = os.path.join(self.cachedir, name)
+            open(path, 'wb').close()
+            os.utime(path, (time.time() - 3600, time.time() - 3600))
+        recent = os.path.join(self.cachedir, 'tmpdef.tmp')
+        open(recent, 'wb').close()
+        # b was used last, so a is evicted
+        c = cache.ImageCache(self.cachedir, max_size=192)
+        c.save()
+        self.failUnless(list(c.index) == [b])
+        self.failUnless(sorted(os.listdir(self.cachedir)) ==
+            sorted([c.index[b]['raw'], 'index.json', 'tmpdef.tmp']))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""bin/pyxie tests;  skipped without python 2 (which the script is written
+for) or PIL."""
+
+import os
+import re
+import sys
+import base64
+import shutil
+import tempfile
+import subprocess
+from unittest import TestCase, skipIf
+
+try:
+    from pyxie.sprite import Image
+except ImportError:
+    Image = None
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+script = os.path.join(root, 'bin', 'pyxie')
+
+@skipIf(sys.version_info[0] > 2 or Image is None, "requires python 2 and PIL")
+class CommandTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def image(self, name, size, colour):
+        Image.new('RGB', size, colour).save(self.path(name))
+        return self.path(name)
+
+    def pyxie(self, *args):
+        """Run pyxie with `args`, returning what it writes to stdout and
+        stderr."""
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([root, env.get('PYTHONPATH', '')])
+        process = subprocess.Popen([sys.executable, script] + list(args), env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, error = process.communicate()
+        self.failUnless(process.returncode == 0, error)
+        return out, error
+
+    def inlined(self, css):
+        """The first pixel of the sprite inlined in the styles at `css`."""
+        data = open(css).read().split('url(data:image/png;base64,')[1].split(')')[0]
+        path = self.path('inlined.png')
+        f = open(path, 'wb')
+        f.write(base64.b64decode(data))
+        f.close()
+        return Image.open(path).convert('RGB').getpixel((0, 0))
+
+    def test_reused_layout_with_inline(self):
+        """Styles with the sprite inlined are rewritten when a reused layout
+        is redrawn."""
+        a = self.image('a.png', (16, 16), (255, 0, 0))
+        b = self.image('b.png', (8, 8), (0, 255, 0))
+        css, spritepath = self.path('s.css'), self.path('sprite.png')
+        args = ['--reuse-layout', '--inline', '100000', '-c', css, spritepath, a, b]
+        self.pyxie(*args)
+        self.failUnless(self.inlined(css) == (255, 0, 0))
+        self.image('a.png', (16, 16), (0, 0, 255))
+        self.pyxie(*args)
+        self.failUnless(Image.open(spritepath).convert('RGB').getpixel((0, 0)) == (0, 0, 255))
+        self.failUnless(self.inlined(css) == (0, 0, 255))
+
+    def test_optimize_order(self):
+        paths = [self.image('%02d.png' % i, (8, 8), [(255, 0, 0), (0, 0, 255)][i % 2])
+            for i in range(8)]
+        spritepath = self.path('sprite.png')
+        out, error = self.pyxie('--optimize-order', '-c', self.path('s.css'), spritepath, *paths)
+        sizes = re.search(r'Encoded size: (\d+) bytes in size order, (\d+) in colour similarity order', error)
+        self.failUnless(sizes)
+        self.failUnless(os.path.getsize(spritepath) == min(int(sizes.group(1)), int(sizes.group(2))))
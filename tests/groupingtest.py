@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""pyxie.grouping tests;  the sprite building tests are skipped without
+PIL."""
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase, skipIf
+
+from pyxie import grouping
+
+try:
+    from pyxie import sprite
+    from pyxie.sprite import Image
+except ImportError:
+    sprite = None
+
+class GroupingTest(TestCase):
+
+    def test_disjoint_pages(self):
+        """Images used on different pages go into different sprites."""
+        usage = {
+            'home': (10, frozenset(['logo', 'search'])),
+            'cart': (5, frozenset(['logo', 'cart'])),
+        }
+        sizes = dict(logo=100, search=50, cart=400)
+        groups = grouping.group_images(usage, sizes)
+        self.failUnless(groups == [['cart'], ['logo'], ['search']])
+
+    def test_request_cost(self):
+        """A request overhead merges groups once it outweighs wasted bytes."""
+        usage = {
+            'home': (10, frozenset(['logo', 'search'])),
+            'cart': (5, frozenset(['logo', 'cart'])),
+        }
+        sizes = dict(logo=100, search=50, cart=400)
+        groups = grouping.group_images(usage, sizes, request_cost=60)
+        # merging logo & search wastes 5 * 50 bytes on cart, but saves 15
+        # requests worth 60 bytes each;  merging cart wastes too much
+        self.failUnless(groups == [['cart'], ['logo', 'search']])
+
+    def test_max_requests(self):
+        """Groups are merged until no page needs more than max_requests."""
+        usage = {
+            'home': (10, frozenset(['logo', 'search'])),
+            'cart': (5, frozenset(['logo', 'cart'])),
+        }
+        sizes = dict(logo=100, search=50, cart=400)
+        groups = grouping.group_images(usage, sizes, max_requests=1)
+        self.failUnless(groups == [['cart', 'logo', 'search']])
+
+    def test_usage_report(self):
+        usage = {'home': (2, frozenset(['logo'])), 'cart': (2, frozenset(['cart']))}
+        sizes = dict(logo=100, cart=300)
+        report = grouping.usage_report(usage, [['cart'], ['logo']], sizes)
+        self.failUnless('expected bytes per page view: 400 before, 200 after' in report)
+
+class UsageTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def usage(self, name, text):
+        path = os.path.join(self.dir, name)
+        f = open(path, 'w')
+        f.write(text)
+        f.close()
+        return grouping.read_usage(path)
+
+    def test_json(self):
+        usage = self.usage('usage.json', """{
+            "/index.html": ["logo", "search"],
+            "/cart.html": {"views": 5, "images": ["logo", "cart"]}
+        }""")
+        self.failUnless(usage == {
+            '/index.html': (1, frozenset(['logo', 'search'])),
+            '/cart.html': (5, frozenset(['logo', 'cart'])),
+        })
+
+    def test_log(self):
+        usage = self.usage('usage.log', """# page views
+/index.html logo search-button
+/cart.html logo cart-icon
+
+/index.html logo\t/img/banner.png
+""")
+        self.failUnless(usage == {
+            '/index.html': (2, frozenset(['logo', 'search-button', '/img/banner.png'])),
+            '/cart.html': (1, frozenset(['logo', 'cart-icon'])),
+        })
+
+@skipIf(sprite is None, "requires PIL")
+class SpritesFromUsageTest(TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.mkdtemp()
+        os.chdir(self.dir)
+        os.mkdir('img')
+        for name, size in [('logo', (32, 32)), ('search', (16, 16)), ('cart', (24, 24))]:
+            Image.new('RGB', size, (255, 0, 0)).save('img/%s.png' % name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def test_one_sprite_per_group(self):
+        # images named by path, filename and css class name
+        usage = {
+            'home': (10, frozenset(['img/logo.png', 'search.png', 'unknown.png'])),
+            'cart': (5, frozenset(['logo.png', 'img-cart'])),
+        }
+        paths = ['img/logo.png', 'img/search.png', 'img/cart.png']
+        sprites, report = sprite.sprites_from_usage(usage, *paths)
+        groups = sorted(sorted(p.rect.data.filename for p in s.field.rectangles) for s in sprites)
+        self.failUnless(groups == [['img/cart.png'], ['img/logo.png'], ['img/search.png']])
+        # both pages need two sprites, so every name was resolved
+        rows = dict((line.split()[0], line.split()[-3:]) for line in report.splitlines()[1:3])
+        self.failUnless(rows == {'home': ['1', '->', '2'], 'cart': ['1', '->', '2']})
+
+    def test_max_requests(self):
+        usage = {
+            'home': (10, frozenset(['logo.png', 'search.png'])),
+            'cart': (5, frozenset(['logo.png', 'cart.png'])),
+        }
+        paths = ['img/logo.png', 'img/search.png', 'img/cart.png']
+        sprites, report = sprite.sprites_from_usage(usage, *paths, max_requests=1,
+            fieldcls=lambda: sprite.VerticalField(0))
+        self.failUnless(len(sprites) == 1 and len(sprites[0].field.rectangles) == 3)
+        self.failUnless(isinstance(sprites[0].field, sprite.VerticalField))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""pyxie.pipeline tests;  skipped without PIL."""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import traceback
+from unittest import TestCase, skipIf
+
+try:
+    from pyxie import pipeline
+    from pyxie.sprite import Image
+except ImportError:
+    pipeline = None
+
+def failing(items):
+    for item in items:
+        if item == 3:
+            raise ValueError("bad item")
+        yield item
+
+@skipIf(pipeline is None, "requires PIL")
+class ThreadedTest(TestCase):
+
+    def test_order(self):
+        stage = pipeline.threaded(lambda items: (i * 2 for i in items), maxsize=2)
+        self.failUnless(list(stage(range(100))) == [i * 2 for i in range(100)])
+
+    def test_traceback(self):
+        """Exceptions keep the traceback from the stage's thread."""
+        output = pipeline.threaded(failing)(range(5))
+        self.failUnless(next(output) == 0)
+        try:
+            list(output)
+        except ValueError:
+            frames = traceback.extract_tb(sys.exc_info()[2])
+        self.failUnless(frames[-1][2] == 'failing')
+
+    def test_eager_stage(self):
+        """A stage that fails before returning its output doesn't leave the
+        consumer waiting."""
+        stage = pipeline.threaded(lambda items: [1 // 0 for i in items])
+        output = stage([1, 2])
+        self.assertRaises(ZeroDivisionError, list, output)
+
+    def test_early_stop(self):
+        """A consumer that stops early stops the stage's thread too."""
+        closed = threading.Event()
+
+        def endless(items):
+            try:
+                while True:
+                    yield 1
+            finally:
+                closed.set()
+
+        output = pipeline.threaded(endless, maxsize=1)(None)
+        self.failUnless(next(output) == 1)
+        output.close()
+        closed.wait(5)
+        self.failUnless(closed.is_set())
+
+class Loading(object):
+    """Records the thread an image is loaded on."""
+
+    def load(self):
+        self.thread = threading.current_thread()
+
+@skipIf(pipeline is None, "requires PIL")
+class StreamTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_decode(self):
+        """A threaded decode stage reads images on its own thread."""
+        images = [Loading() for i in range(4)]
+        decoded = list(pipeline.threaded(pipeline.decode(), maxsize=1)(images))
+        self.failUnless(decoded == images)
+        threads = set([img.thread for img in images])
+        self.failUnless(len(threads) == 1 and threading.current_thread() not in threads)
+
+    def test_stream(self):
+        colours = {}
+        for i in range(20):
+            path = os.path.join(self.dir, 'img%02d.png' % i)
+            colours[path] = (i * 10, 255 - i * 10, 0)
+            Image.new('RGB', (8 + i % 5, 4 + i % 3), colours[path]).save(path)
+        build = pipeline.Pipeline(pipeline.discover(), pipeline.probe(batch=4),
+                pipeline.threaded(pipeline.decode(), maxsize=2),
+                pipeline.stream(width=32, lookahead=4))
+        s = list(build.run([os.path.join(self.dir, '*.png')]))[0]
+        self.failUnless(len(s.field.rectangles) == 20)
+        self.failUnless(s.img.size == (s.field.x, s.field.y) and s.field.x <= 32)
+        for pos in s.field.rectangles:
+            corner = (pos.x + pos.rect.x - 1, pos.y + pos.rect.y - 1)
+            self.failUnless(s.img.getpixel(corner)[:3] == colours[pos.rect.data.filename])
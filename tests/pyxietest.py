@@ -261,3 +261,50 @@ class PackerTest(TestCase):
         self.failUnless(f.x == 1928)
         self.failUnless(f.y == 100)
 
+    def test_no_placement(self):
+        """A field with no free corners raises a PackingError."""
+        f = packer.Field()
+        f.add_rectangle(packer.Rectangle(16, 16))
+        f.rectangles[0].tr = f.rectangles[0].bl = True
+        self.assertRaises(packer.PackingError, f.add_rectangle, packer.Rectangle(8, 8))
+
+
+class SkylineTest(TestCase):
+
+    def test_skyline_placement(self):
+        """Rectangles go into the lowest gap along the skyline."""
+        f = packer.SkylineField(128)
+        # +-------------+-------+
+        # |   64x32     | 64x16 |
+        # |             +-------+
+        # +-------------+ 32x16 |
+        #               +---+
+        for args in [(64, 32), (64, 16), (32, 16)]:
+            f.add_rectangle(packer.Rectangle(*args))
+        placed = [(r.x, r.y) for r in f.rectangles]
+        self.failUnless(placed == [(0, 0), (64, 0), (64, 16)])
+        self.failUnless(f.x == 128)
+        self.failUnless(f.y == 32)
+        self.failUnless(f.skyline == [[0, 32, 96], [96, 16, 32]])
+
+    def test_skyline_widens(self):
+        """A rectangle wider than the field widens it."""
+        f = packer.SkylineField(32)
+        f.add_rectangle(packer.Rectangle(32, 32))
+        f.add_rectangle(packer.Rectangle(64, 8))
+        self.failUnless((f.rectangles[1].x, f.rectangles[1].y) == (0, 32))
+        self.failUnless(f.width == 64 and f.x == 64 and f.y == 40)
+
+    def test_pack_stream(self):
+        """Streamed rectangles are all placed, largest of the lookahead
+        first, without overlapping."""
+        sizes = [(8, 8), (32, 16), (16, 16), (4, 4), (32, 32), (16, 8)]
+        f = packer.SkylineField(48)
+        rects = (packer.Rectangle(*args) for args in sizes)
+        placed = list(packer.pack_stream(rects, f, lookahead=2))
+        self.failUnless(len(placed) == len(sizes))
+        self.failUnless((placed[0].rect.x, placed[0].rect.y) == (32, 16))
+        for i, a in enumerate(placed):
+            for b in placed[i+1:]:
+                self.failUnless(a.x + a.rect.x <= b.x or b.x + b.rect.x <= a.x or
+                        a.y + a.rect.y <= b.y or b.y + b.rect.y <= a.y)
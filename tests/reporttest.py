@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""pyxie.report tests;  skipped without PIL."""
+
+import os
+import json
+import shutil
+import tempfile
+from unittest import TestCase, skipIf
+
+from pyxie import packer
+
+try:
+    from pyxie import report, sprite
+    from pyxie.sprite import Image
+except ImportError:
+    report = None
+
+@skipIf(report is None, "requires PIL")
+class ReportTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def sprite(self, sizes, **kwargs):
+        paths = []
+        for i, size in enumerate(sizes):
+            path = os.path.join(self.dir, 'img%d.png' % i)
+            Image.new('RGB', size, (i * 20, 0, 0)).save(path)
+            paths.append(path)
+        return sprite.sprite_from_paths(*paths, **kwargs)
+
+    def test_regions(self):
+        # a 32x8 strip over a 16x8 square, leaving the bottom right empty
+        s = self.sprite([(32, 8), (16, 8)], fieldcls=lambda: packer.VerticalField(0))
+        cells = report.regions(s, 2)
+        self.failUnless([(c['x'], c['y'], c['w'], c['h']) for c in cells] ==
+            [(0, 0, 16, 8), (16, 0, 16, 8), (0, 8, 16, 8), (16, 8, 16, 8)])
+        self.failUnless([c['fill'] for c in cells] == [1.0, 1.0, 1.0, 0.0])
+        self.failUnless([c['wasted'] for c in cells] == [0, 0, 0, 128])
+
+    def test_sprite_report(self):
+        s = self.sprite([(32, 8), (16, 8)], fieldcls=lambda: packer.VerticalField(0))
+        s.write(os.path.join(self.dir, 'sprite.png'))
+        r = report.sprite_report(s, grid=2)
+        self.failUnless((r['width'], r['height'], r['mode']) == (32, 16, 'RGBA'))
+        self.failUnless(r['fill'] == 0.75 and r['wasted'] == 128)
+        self.failUnless(r['memory'] == 32 * 16 * 4)
+        self.failUnless(r['encoded'] == os.path.getsize(s.filename))
+        self.failUnless(r['inputs'] == sum([os.path.getsize(i['filename']) for i in r['images']]))
+        self.failUnless([(i['w'], i['h'], i['share']) for i in r['images']] ==
+            [(32, 8, 0.5), (16, 8, 0.25)])
+        self.failUnless(r['images'][0]['name'] == sprite.slugify(r['images'][0]['filename']))
+        self.failUnless(len(r['regions']) == 4)
+        # the report can be written out as json
+        self.failUnless(json.loads(json.dumps(r))['wasted'] == 128)
+
+    def test_space_wasters(self):
+        s = self.sprite([(32, 32), (8, 8), (8, 8), (8, 8)],
+            fieldcls=lambda: packer.VerticalField(0))
+        wasters = report.space_wasters(s)
+        self.failUnless(wasters[0]['filename'].endswith('img0.png'))
+        self.failUnless((wasters[0]['width'], wasters[0]['height']) == (8, 24))
+        self.failUnless(wasters[0]['saving'] == 32 * 56 - 8 * 24)
+        self.failUnless([w['saving'] for w in wasters[1:]] == [32 * 8, 32 * 8, 32 * 8])
+        self.failUnless(report.space_wasters(s, count=2, candidates=1) == wasters[:1])
+
+    def test_no_savings(self):
+        """Images whose removal doesn't shrink the sheet aren't listed."""
+        # the small images sit side by side below the large one
+        s = self.sprite([(32, 32), (8, 8), (8, 8)])
+        self.failUnless((s.field.x, s.field.y) == (32, 40))
+        savings = dict((os.path.basename(w['filename']), w['saving'])
+            for w in report.space_wasters(s))
+        self.failUnless(savings == {'img0.png': 32 * 40 - 8 * 16})
+        self.failUnless(report.space_wasters(self.sprite([(8, 8)])) == [])
+
+    def test_large_greedy_sheets(self):
+        s = self.sprite([(32, 32), (8, 8), (8, 8), (8, 8)])
+        wasters = report.space_wasters(s, max_greedy=2)
+        self.failUnless(wasters[0]['filename'].endswith('img0.png'))
+        self.failUnless(wasters[0]['width'] <= s.field.x)
+
+    def test_report_html(self):
+        s = self.sprite([(32, 8), (16, 8)], fieldcls=lambda: packer.VerticalField(0))
+        s.write(os.path.join(self.dir, 'sprite.png'))
+        html = report.report_html([report.sprite_report(s, grid=2)])
+        self.failUnless('<h2>%s</h2>' % s.filename in html)
+        self.failUnless('32x16 RGBA, 75.0% filled (128 px wasted)' in html)
+        self.failUnless('<tr><td>100%</td><td>100%</td></tr>\n<tr><td>100%</td><td>0%</td></tr>' in html)
+        self.failUnless('<td>32x8</td><td>50.0%</td>' in html)
+        self.failUnless('img0.png</td><td>16x8</td><td>384 px</td>' in html)
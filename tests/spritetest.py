@@ -0,0 +1,508 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""pyxie.sprite tests;  skipped without PIL."""
+
+import base64
+import json
+import os
+import shutil
+import multiprocessing
+import tempfile
+from unittest import TestCase, skipIf
+
+from pyxie import packer
+
+try:
+    from pyxie import sprite
+    from pyxie.sprite import Image
+except ImportError:
+    sprite = None
+
+class ImageTestCase(TestCase):
+    """Makes images in a temporary directory."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def image(self, name, size, colour=(255, 0, 0), mode='RGB'):
+        """Save a solid image as `name` and return its path."""
+        path = self.path(name)
+        Image.new(mode, size, colour).save(path)
+        return path
+
+@skipIf(sprite is None, "requires PIL")
+class LayoutTest(ImageTestCase):
+
+    def build(self, paths, spritepath, options='opts', **kwargs):
+        s = sprite.sprite_from_paths(*paths, **kwargs)
+        s.write(spritepath)
+        s.write_layout(sprite.layout_path(spritepath), options)
+        return s
+
+    def test_stale_layouts(self):
+        """A layout is only reused for the same names, sizes and options."""
+        a = self.image('a.png', (16, 16))
+        b = self.image('b.png', (8, 8))
+        spritepath = self.path('sprite.png')
+        self.build([a, b], spritepath)
+        layout = sprite.read_layout(sprite.layout_path(spritepath))
+        self.failUnless(sprite.sprite_from_layout(layout, a, b, options='opts'))
+        self.failUnless(sprite.sprite_from_layout(layout, a, b, options='other') is None)
+        c = self.image('c.png', (8, 8))
+        self.failUnless(sprite.sprite_from_layout(layout, a, c, options='opts') is None)
+        self.failUnless(sprite.sprite_from_layout(layout, a, options='opts') is None)
+        self.image('b.png', (8, 9))
+        self.failUnless(sprite.sprite_from_layout(layout, a, b, options='opts') is None)
+
+    def test_redraws_changed_images_only(self):
+        a = self.image('a.png', (16, 16), (255, 0, 0))
+        b = self.image('b.png', (8, 8), (0, 255, 0))
+        spritepath = self.path('sprite.png')
+        s = self.build([a, b], spritepath)
+        pos = dict((p.rect.data.filename, p) for p in s.field.rectangles)
+        # paint over b on the old sheet;  it is only redrawn if it changed
+        sheet = Image.open(spritepath).convert('RGB')
+        sheet.paste((0, 0, 255), (pos[b].x, pos[b].y, pos[b].x + 8, pos[b].y + 8))
+        sheet.save(spritepath)
+        self.image('a.png', (16, 16), (255, 255, 0))
+        layout = sprite.read_layout(sprite.layout_path(spritepath))
+        reused = sprite.sprite_from_layout(layout, a, b, options='opts')
+        self.failUnless(reused.img.getpixel((pos[a].x, pos[a].y))[:3] == (255, 255, 0))
+        self.failUnless(reused.img.getpixel((pos[b].x, pos[b].y))[:3] == (0, 0, 255))
+
+    def test_keeps_field_class(self):
+        a = self.image('a.png', (16, 4))
+        b = self.image('b.png', (16, 8))
+        spritepath = self.path('sprite.png')
+        self.build([a, b], spritepath, fieldcls=lambda: packer.VerticalField(2))
+        layout = sprite.read_layout(sprite.layout_path(spritepath))
+        reused = sprite.sprite_from_layout(layout, a, b, options='opts')
+        self.failUnless(isinstance(reused.field, packer.VerticalField))
+        self.failUnless(reused.field.padding == 2)
+        self.failUnless((reused.field.x, reused.field.y) == (16, 14))
+
+@skipIf(sprite is None, "requires PIL")
+class StyleTest(ImageTestCase):
+    """Styles for a 16x16 image above a 16x8 one."""
+
+    def setUp(self):
+        super(StyleTest, self).setUp()
+        self.cwd = os.getcwd()
+        os.chdir(self.dir)
+        self.image('a.png', (16, 16))
+        self.image('b.png', (16, 8), (0, 255, 0))
+        self.sprite = sprite.sprite_from_paths('a.png', 'b.png')
+        self.sprite.write('s.png')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        super(StyleTest, self).tearDown()
+
+    def test_css(self):
+        css = self.sprite.css('/s.png')
+        self.failUnless(css.startswith(""".a {
+    background: transparent url(/s.png) -0px -0px no-repeat;
+    width: 16px; height: 16px;
+}
+"""))
+        self.failUnless(".b-bgr { background: transparent url(/s.png) right -16px no-repeat }" in css)
+
+    def test_compact_css(self):
+        css = self.sprite.css('/s.png', compact=True)
+        self.failUnless(css == """.a,
+.a-bg,
+.a-bgr,
+.b,
+.b-bg,
+.b-bgr {
+    background: transparent url(/s.png) no-repeat;
+}
+.a { background-position: -0px -0px; width: 16px; height: 16px }
+.a-bg { background-position: -0px -0px }
+.a-bgr { background-position: right -0px }
+.b { background-position: -0px -16px; width: 16px; height: 8px }
+.b-bg { background-position: -0px -16px }
+.b-bgr { background-position: right -16px }
+""")
+
+    def test_no_variants(self):
+        css = self.sprite.css('/s.png', compact=True, variants=False)
+        self.failUnless(css == """.a,
+.b {
+    background: transparent url(/s.png) no-repeat;
+}
+.a { background-position: -0px -0px; width: 16px; height: 16px }
+.b { background-position: -0px -16px; width: 16px; height: 8px }
+""")
+        css = self.sprite.css('/s.png', variants=False)
+        self.failUnless('-bg' not in css and css.count('background:') == 2)
+
+    def test_compact_sass(self):
+        sass = self.sprite.sass('/s.png', compact=True, variants=False)
+        self.failUnless(sass == """%s-sheet
+    background: transparent url(/s.png) no-repeat
+
+=a
+    @extend %s-sheet
+    background-position: -0px -0px
+    width: 16px
+    height: 16px
+
+=b
+    @extend %s-sheet
+    background-position: -0px -16px
+    width: 16px
+    height: 8px
+""")
+        sass = self.sprite.sass('/s.png', compact=True)
+        self.failUnless("=b-bgr\n    @extend %s-sheet\n    background-position: right -16px" in sass)
+
+    def test_unwritten(self):
+        unwritten = sprite.sprite_from_paths('a.png')
+        self.assertRaises(sprite.SpriteError, unwritten.css)
+        self.assertRaises(sprite.SpriteError, unwritten.sass)
+        self.failUnless('url(/u.png)' in unwritten.sass('/u.png'))
+
+    def test_inline(self):
+        data = open('s.png', 'rb').read()
+        uri = self.sprite.data_uri()
+        self.failUnless(uri.startswith('data:image/png;base64,'))
+        self.failUnless(base64.b64decode(uri.split(',', 1)[1]) == data)
+        css = self.sprite.css('/s.png', inline=len(data))
+        self.failUnless(css.count('url(data:image/png;base64,') == 1)
+        self.failUnless('.a { background-position: -0px -0px' in css)
+        css = self.sprite.css('/s.png', inline=len(data) - 1)
+        self.failUnless('url(/s.png)' in css and 'data:' not in css)
+
+    def test_inline_reuses_written_sprite(self):
+        def save(*args, **kwargs):
+            raise AssertionError("sprite encoded again")
+        self.sprite.img.save = save
+        page = self.sprite.html(inline=100000)
+        self.failUnless('url(data:image/png;base64,' in page)
+        self.failUnless('inline: 0 reqs' in page)
+        self.assertRaises(AssertionError, self.sprite.encode, 'GIF')
+
+@skipIf(sprite is None, "requires PIL")
+class ModeTest(ImageTestCase):
+
+    def open(self, *specs):
+        """Open an image made for each of `specs`, a list of (name, size,
+        colour, mode)."""
+        return sprite.open_images([self.image(*spec) for spec in specs])
+
+    def mode(self, *specs, **kwargs):
+        field = sprite.autopack(*self.open(*specs), **kwargs)
+        return sprite.canvas_mode(field)[0]
+
+    def paletted(self, name, colours, transparency=None):
+        img = Image.new('P', (max(8, len(colours)), 8), 0)
+        palette = []
+        for colour in colours:
+            palette.extend(colour)
+        img.putpalette(palette + [0] * (768 - len(palette)))
+        for i in range(len(colours)):
+            img.paste(i, (i, 0, i + 1, 8))
+        path = self.path(name)
+        if transparency is None:
+            img.save(path)
+        else:
+            img.save(path, transparency=transparency)
+        return Image.open(path)
+
+    def test_canvas_mode(self):
+        vertical = dict(fieldcls=lambda: packer.VerticalField(0))
+        self.failUnless(self.mode(('a.png', (8, 8), (255, 0, 0), 'RGB'),
+            ('b.png', (8, 8), (0, 255, 0), 'RGB'), **vertical) == 'RGB')
+        self.failUnless(self.mode(('a.png', (8, 8), 128, 'L'),
+            ('b.png', (8, 8), 0, 'L'), **vertical) == 'L')
+        self.failUnless(self.mode(('a.png', (8, 8), 128, 'L'),
+            ('b.png', (8, 8), (0, 0, 255), 'RGB'), **vertical) == 'RGB')
+        # the sheet isn't covered
+        self.failUnless(self.mode(('a.png', (8, 8), 128, 'L'),
+            ('b.png', (4, 4), 0, 'L'), **vertical) == 'LA')
+
+    def test_opaque_alpha_band(self):
+        vertical = dict(fieldcls=lambda: packer.VerticalField(0))
+        self.failUnless(self.mode(('a.png', (8, 8), (255, 0, 0, 255), 'RGBA'),
+            ('b.png', (8, 8), (0, 255, 0), 'RGB'), **vertical) == 'RGB')
+        self.failUnless(self.mode(('a.png', (8, 8), (255, 0, 0, 254), 'RGBA'),
+            ('b.png', (8, 8), (0, 255, 0), 'RGB'), **vertical) == 'RGBA')
+        self.failUnless(self.mode(('a.png', (8, 8), (0, 255), 'LA'),
+            ('b.png', (8, 8), 0, 'L'), **vertical) == 'L')
+
+    def test_shared_palette(self):
+        a = self.paletted('a.gif', [(255, 0, 0), (0, 0, 0)], transparency=1)
+        b = self.paletted('b.gif', [(0, 255, 0), (255, 0, 0)])
+        palette = sprite.SharedPalette(0)
+        self.failUnless(palette.add(a) and palette.add(b))
+        self.failUnless(sorted(palette.rgb.values()) == [1, 2])
+        remapped = palette.remap(a)
+        self.failUnless(remapped.getpixel((0, 0)) == palette.rgb[(255, 0, 0)])
+        self.failUnless(remapped.getpixel((1, 0)) == 0)
+        self.failUnless(palette.remap(b).getpixel((1, 0)) == palette.rgb[(255, 0, 0)])
+        # a transparent image needs a transparent index
+        self.failIf(sprite.SharedPalette().add(a))
+
+    def test_full_palette(self):
+        colours = [(i, i, 255 - i) for i in range(255)]
+        palette = sprite.SharedPalette(0)
+        self.failUnless(palette.add(self.paletted('a.gif', colours[:200])))
+        # 55 more colours and the transparent index fill the palette
+        self.failUnless(palette.add(self.paletted('b.gif', colours[100:])))
+        self.failIf(palette.add(self.paletted('c.gif', [(255, 255, 255)])))
+        self.failUnless(sprite.SharedPalette().add(self.paletted('d.gif', colours + [(1, 2, 3)])))
+
+    def test_paletted_sprite(self):
+        a = self.paletted('a.gif', [(255, 0, 0), (0, 0, 0)], transparency=1)
+        b = self.paletted('b.gif', [(0, 255, 0), (0, 0, 255)])
+        s = sprite.Sprite(sprite.autopack(a, b, fieldcls=lambda: packer.VerticalField(0)))
+        self.failUnless(s.mode == 'P')
+        s.write(self.path('s.gif'))
+        img = Image.open(self.path('s.gif')).convert('RGBA')
+        pos = [p for p in s.field.rectangles if p.rect.data is a][0]
+        self.failUnless(img.getpixel((pos.x, pos.y)) == (255, 0, 0, 255))
+        self.failUnless(img.getpixel((pos.x + 1, pos.y))[3] == 0)
+
+    def test_transparent_gif(self):
+        """A sheet with an alpha channel keeps its transparent pixels, and
+        only those, when saved as GIF."""
+        a = self.image('a.png', (8, 8), (255, 0, 0, 0), 'RGBA')
+        b = self.image('b.png', (8, 8), (255, 0, 0), 'RGB')
+        c = self.image('c.gif', (8, 8), (0, 0, 255), 'RGB')
+        s = sprite.sprite_from_paths(a, b, c, fieldcls=lambda: packer.VerticalField(0))
+        self.failUnless(s.mode == 'RGBA')
+        s.write(self.path('s.gif'))
+        img = Image.open(self.path('s.gif')).convert('RGBA')
+        pixels = dict((os.path.basename(p.rect.data.filename), img.getpixel((p.x, p.y)))
+            for p in s.field.rectangles)
+        self.failUnless(pixels['a.png'][3] == 0)
+        self.failUnless(pixels['b.png'] == (255, 0, 0, 255))
+        self.failUnless(pixels['c.gif'] == (0, 0, 255, 255))
+
+@skipIf(sprite is None, "requires PIL")
+class FingerprintTest(ImageTestCase):
+
+    def test_fingerprinted(self):
+        self.failUnless(sprite.fingerprinted('sprite.png', '1a2b3c4d') == 'sprite.1a2b3c4d.png')
+        self.failUnless(sprite.fingerprinted('/static/a.b/sprite.png', 'ff') ==
+            '/static/a.b/sprite.ff.png')
+
+    def test_url(self):
+        s = sprite.sprite_from_paths(self.image('a.png', (8, 8)))
+        s.write(self.path('plain.png'))
+        self.failUnless(s.url() == self.path('plain.png'))
+        self.failUnless(s.url('/s.png') == '/s.png')
+        s.write(self.path('s.png'), fingerprint=True)
+        self.failUnless(len(s.fingerprint) == 8)
+        self.failUnless(s.filename == self.path('s.%s.png' % s.fingerprint))
+        self.failUnless(os.path.exists(s.filename))
+        self.failIf(os.path.exists(self.path('s.png')))
+        self.failUnless(s.url() == s.filename)
+        self.failUnless(s.url('/static/s.png') == '/static/s.%s.png' % s.fingerprint)
+        self.failUnless('url(/static/s.%s.png)' % s.fingerprint in s.css('/static/s.png'))
+
+    def test_manifest(self):
+        os.mkdir(self.path('static'))
+        a = sprite.sprite_from_paths(self.image('a.png', (8, 8)))
+        a.write(self.path('static/a.png'), fingerprint=True)
+        b = sprite.sprite_from_paths(self.image('b.png', (8, 4)))
+        b.write(self.path('b.png'), fingerprint=True)
+        manifest = self.path('static/manifest.json')
+        sprite.update_manifest(manifest, a)
+        f = open(manifest, 'w')
+        f.write('{"old.png": "old.1234.png"}')
+        f.close()
+        sprite.update_manifest(manifest, a, b)
+        f = open(manifest)
+        try:
+            names = json.load(f)
+        finally:
+            f.close()
+        self.failUnless(names == {
+            'old.png': 'old.1234.png',
+            'a.png': 'a.%s.png' % a.fingerprint,
+            '../b.png': '../b.%s.png' % b.fingerprint,
+        })
+
+@skipIf(sprite is None, "requires PIL")
+class RouteTest(ImageTestCase):
+
+    def routes(self, text):
+        path = self.path('routes.json')
+        f = open(path, 'w')
+        f.write(text)
+        f.close()
+        return path
+
+    def test_route_by_name(self):
+        paths = ['header-repeat-x.png', 'repeat-y/rule.png', 'icons/repeat-x_bar.gif',
+            'logo.png', 'repeat-xl.png', 'norepeat-y.png', 'icons.zip/repeat-y.png']
+        routed = sprite.route_images(paths)
+        self.failUnless(routed['repeat-x'] == ['header-repeat-x.png', 'icons/repeat-x_bar.gif'])
+        self.failUnless(routed['repeat-y'] == ['repeat-y/rule.png', 'icons.zip/repeat-y.png'])
+        self.failUnless(routed['no-repeat'] == ['logo.png', 'repeat-xl.png', 'norepeat-y.png'])
+
+    def test_route_by_pattern(self):
+        routes = sprite.read_routes(self.routes(
+            '{"repeat-x": ["header*.png", "tabs/*.png"], "repeat-y": ["rule.png"]}'))
+        paths = ['img/header.png', 'tabs/on.png', 'img/rule.png', 'img/tabs.png',
+            'bar-repeat-x.png', 'header-repeat-y.png']
+        routed = sprite.route_images(paths, routes)
+        # patterns win over names, and unmatched paths are routed by name
+        self.failUnless(routed['repeat-x'] ==
+            ['img/header.png', 'tabs/on.png', 'bar-repeat-x.png', 'header-repeat-y.png'])
+        self.failUnless(routed['repeat-y'] == ['img/rule.png'])
+        self.failUnless(routed['no-repeat'] == ['img/tabs.png'])
+
+    def test_bad_routes(self):
+        for text in ('{"repeat-z": []}', '{"repeat-x": "a.png"}', '["a.png"]', '{'):
+            self.assertRaises(sprite.SpriteError, sprite.read_routes, self.routes(text))
+
+    def test_repeat_path(self):
+        self.failUnless(sprite.repeat_path('out/sprite.png', 'no-repeat') == 'out/sprite.png')
+        self.failUnless(sprite.repeat_path('out/sprite.png', 'repeat-x') == 'out/sprite-x.png')
+        self.failUnless(sprite.repeat_path('out.d/sprite.gif', 'repeat-y') == 'out.d/sprite-y.gif')
+
+    def test_sprites_by_repeat(self):
+        paths = [self.image('a-repeat-x.png', (16, 4)), self.image('b-repeat-x.png', (16, 8)),
+            self.image('c.png', (8, 8))]
+        sprites = sprite.sprites_by_repeat(paths, ypadding=2)
+        self.failUnless([s.repeat for s in sprites] == ['no-repeat', 'repeat-x'])
+        self.failUnless(isinstance(sprites[1].field, packer.VerticalField))
+        self.failUnless((sprites[1].field.x, sprites[1].field.y) == (16, 14))
+
+@skipIf(sprite is None, "requires PIL")
+class SimilarityTest(ImageTestCase):
+
+    def images(self, specs):
+        return sprite.open_images([self.image(name, size, colour)
+            for name, size, colour in specs])
+
+    def test_similar_images_adjacent(self):
+        # by name, reds and blues alternate
+        images = self.images([('a.png', (8, 8), (255, 0, 0)), ('b.png', (8, 8), (0, 0, 255)),
+            ('c.png', (8, 8), (250, 10, 0)), ('d.png', (8, 8), (0, 10, 250))])
+        vertical = lambda: packer.VerticalField(0)
+        def colours(field):
+            rects = sorted(field.rectangles, key=lambda p: p.y)
+            return [os.path.basename(p.rect.data.filename) for p in rects]
+        default = colours(sprite.autopack(*images, fieldcls=vertical))
+        self.failUnless(default == ['d.png', 'c.png', 'b.png', 'a.png'])
+        similar = colours(sprite.autopack(*images, fieldcls=vertical, order='similarity'))
+        self.failUnless(similar == ['d.png', 'b.png', 'c.png', 'a.png'])
+
+    def test_same_dimensions(self):
+        specs = []
+        for i in range(12):
+            size = [(16, 16), (8, 8), (24, 8)][i % 3]
+            specs.append(('%02d.png' % i, size, ((i * 40) % 256, (i * 90) % 256, 0)))
+        images = self.images(specs)
+        for fieldcls in (packer.Field, lambda: packer.VerticalField(1),
+                lambda: packer.HorizontalField(1)):
+            default = sprite.autopack(*images, fieldcls=fieldcls)
+            similar = sprite.autopack(*images, fieldcls=fieldcls, order='similarity')
+            self.failUnless((default.x, default.y) == (similar.x, similar.y))
+            # images only swap places with images of the same size
+            sizes = lambda f: sorted((p.x, p.y, p.rect.x, p.rect.y) for p in f.rectangles)
+            self.failUnless(sizes(default) == sizes(similar))
+
+    def test_colour_signature(self):
+        red, blue, dark = self.images([('r.png', (8, 8), (255, 0, 0)),
+            ('b.png', (4, 4), (0, 0, 255)), ('d.png', (8, 8), (250, 10, 0))])
+        signature = sprite.colour_signature(red)
+        self.failUnless(len(signature) == 256 and sum(signature) == 64)
+        self.failUnless(sprite.colour_distance(signature, sprite.colour_signature(dark)) == 0)
+        self.failUnless(sprite.colour_distance(signature, sprite.colour_signature(blue)) == 128)
+
+    def test_smallest_sprite(self):
+        specs = [('%02d.png' % i, (8, 8), [(255, 0, 0), (0, 0, 255)][i % 2]) for i in range(8)]
+        s, sizes = sprite.smallest_sprite(*self.images(specs))
+        self.failUnless(sorted(sizes) == ['similarity', 'size'])
+        # alternating reds and blues compress worse than runs of each
+        self.failUnless(sizes['similarity'] < sizes['size'])
+        self.failUnless(len(s.encode()) == sizes['similarity'])
+        s, sizes = sprite.smallest_sprite(*self.images(specs), format='GIF')
+        self.failUnless(len(s.encode('GIF')) == min(sizes.values()))
+
+class RecordingPool(object):
+    """Runs jobs in this process, recording them."""
+    def __init__(self):
+        self.jobs = []
+
+    def apply(self, func, args):
+        self.jobs.append(args)
+        return func(*args)
+
+@skipIf(sprite is None, "requires PIL")
+class BuildManyTest(ImageTestCase):
+
+    def groups(self):
+        groups = []
+        for g in range(3):
+            groups.append(sprite.open_images([self.image('%d-%d.png' % (g, i),
+                (8 + (i * 7 + g) % 20, 8 + (i * 5) % 16), (g * 80, i * 20, 0))
+                for i in range(12)]))
+        return groups
+
+    def positions(self, s):
+        return sorted((p.rect.data.filename, p.x, p.y) for p in s.field.rectangles)
+
+    def check(self, **kwargs):
+        groups = self.groups()
+        options = [{}, dict(fieldcls=lambda: packer.VerticalField(2), packtype='Vertical'),
+            dict(fieldcls=lambda: packer.HorizontalField(1), packtype='Horizontal')]
+        sprites = sprite.build_many(groups, processes=2, options=options, **kwargs)
+        for images, extra, s in zip(groups, options, sprites):
+            expected = sprite.autopack(*images, **extra)
+            self.failUnless(type(s.field) is type(expected))
+            self.failUnless((s.field.x, s.field.y) == (expected.x, expected.y))
+            self.failUnless(self.positions(s) == self.positions(sprite.Sprite(expected)))
+            for pos in s.field.rectangles:
+                self.failUnless(s.img.getpixel((pos.x, pos.y))[:3] == pos.rect.data.getpixel((0, 0)))
+        self.failUnless(sprites[1].field.padding == 2)
+
+    def test_same_as_autopack(self):
+        self.check()
+
+    def test_process_pool(self):
+        pool = multiprocessing.Pool(2)
+        try:
+            self.check(pool=pool)
+        finally:
+            pool.close()
+            pool.join()
+
+    def test_threads_by_default(self):
+        pack = sprite._pack_in
+        def fail(*args):
+            raise AssertionError("packed on a process pool")
+        sprite._pack_in = fail
+        try:
+            self.check()
+        finally:
+            sprite._pack_in = pack
+
+    def test_packs_sizes_on_the_pool(self):
+        """Only sizes and names go to the pool, and groups that can't be
+        packed from their sizes alone are packed here."""
+        pool = RecordingPool()
+        groups = self.groups()
+        options = [{}, dict(order='similarity'), dict(fieldcls=lambda: Custom())]
+        class Custom(packer.VerticalField):
+            pass
+        sprites = sprite.build_many(groups, options=options, pool=pool)
+        self.failUnless(len(pool.jobs) == 1)
+        field_options, sizes, kwargs = pool.jobs[0]
+        self.failUnless(field_options == dict(type='Field'))
+        self.failUnless(sizes == [(img.size, img.filename) for img in groups[0]])
+        self.failUnless(isinstance(sprites[2].field, Custom))
+        self.failUnless(sorted(self.positions(sprites[1])) ==
+            sorted(self.positions(sprite.Sprite(sprite.autopack(*groups[1], order='similarity')))))